@@ -2,32 +2,54 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import hmac
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import base64
+import hashlib
+import os
+import uuid
+import weakref
+from flask import Blueprint, Flask, current_app, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, stream_with_context, has_request_context
+from flask.cli import ScriptInfo
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
+import click
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from flask_migrate import Migrate
 import sys
 import time
 from datetime import datetime
-from sqlalchemy.ext.declarative import declarative_base
-from forms import *
+from functools import lru_cache, partial, wraps
+from itertools import groupby
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine.url import make_url
+from typeahead import PrefixIndex
+from cache import PageCache
+from formatting import format_datetime, format_datetimes
+from exporter import MIMETYPES, serialize_rows
+from invalidation import InvalidationListener, notify
+from routing import RoutingSession, pin_to_primary, primary_reads, replica_read
+from pooling import pool_stats
+from summaries import BackgroundRefresher, refresh_summaries
+from thumbnails import ImageError, ThumbnailCache, fetch_image, image_type, make_thumbnail, sign, thumbnail_key
+import assets
+import instrumentation
+
+# forms (wtforms), importer, dateutil, psycopg2 and flask_migrate (alembic)
+# are imported where they are used, so web workers and CLI commands that
+# never need them start faster.
 
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# The extensions and the blueprint are bound to an app by create_app().
+moment = Moment()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+bp = Blueprint('main', __name__, cli_group=None)
 
 
 #----------------------------------------------------------------------------#
@@ -37,14 +59,23 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_area_name', 'state', 'city', 'name', 'id'),
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String())
-    city = db.Column(db.String())
-    state = db.Column(db.String())
+    # NOT NULL: the listing pages on (state, city, name, id), and a row
+    # comparison with a NULL in it would end the paging early.
+    name = db.Column(db.String(), nullable=False)
+    city = db.Column(db.String(), nullable=False)
+    state = db.Column(db.String(), nullable=False)
     address = db.Column(db.String())
     phone = db.Column(db.String())
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(ARRAY(db.String), nullable=False)
     image_link = db.Column(db.String(
     ), default="https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60")
     facebook_link = db.Column(db.String())
@@ -57,18 +88,36 @@ class Venue(db.Model):
     # that further will be distributed to upcoming and past shows
     venue_shows = db.relationship('Show', backref='venue-shows', lazy=True)
 
+    # Denormalized show counts, maintained by count_shows() on every show
+    # write and moved from upcoming to past by `flask rollover-shows`.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Bumped on every write that changes what the venue pages show; the
+    # JSON API derives its ETag / Last-Modified from it.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+
     # DONE:: implement any missing fields, as a database migration using Flask-Migrate
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(), nullable=False)
     city = db.Column(db.String())
     state = db.Column(db.String())
     phone = db.Column(db.String())
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(ARRAY(db.String), nullable=False)
     image_link = db.Column(db.String(),
                            default="https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60")
     facebook_link = db.Column(db.String())
@@ -82,6 +131,17 @@ class Artist(db.Model):
     # that further will be distributed to upcoming and past shows
     artist_shows = db.relationship('Show', backref='artist-shows', lazy=True)
 
+    # Denormalized show counts, maintained by count_shows() on every show
+    # write and moved from upcoming to past by `flask rollover-shows`.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Bumped on every write that changes what the artist pages show; the
+    # JSON API derives its ETag / Last-Modified from it.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+
     # Done: implement any missing fields, as a database migration using Flask-Migrate
 
 # DONE: Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -89,122 +149,689 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venue.id'), nullable=False,)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'artist.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+
+
+class ShowRollover(db.Model):
+    # Single row holding the instant the show counters are current as of:
+    # a show counts as upcoming while its start_time is after last_run.
+    __tablename__ = 'show_rollover'
+    id = db.Column(db.Integer, primary_key=True)
+    last_run = db.Column(db.DateTime, nullable=False)
+
+
+# Materialized show summaries (see the show summaries migration). They live
+# in their own MetaData so create_all and autogenerate never treat them as
+# tables.
+summary_metadata = db.MetaData()
+
+venue_show_summary = db.Table(
+    'venue_show_summary', summary_metadata,
+    db.Column('show_id', db.Integer, primary_key=True),
+    db.Column('venue_id', db.Integer),
+    db.Column('start_time', db.DateTime),
+    db.Column('artist_id', db.Integer),
+    db.Column('artist_name', db.String),
+    db.Column('artist_image_link', db.String),
+)
+
+artist_show_summary = db.Table(
+    'artist_show_summary', summary_metadata,
+    db.Column('show_id', db.Integer, primary_key=True),
+    db.Column('artist_id', db.Integer),
+    db.Column('start_time', db.DateTime),
+    db.Column('venue_id', db.Integer),
+    db.Column('venue_name', db.String),
+    db.Column('venue_image_link', db.String),
+)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
-
-
-app.jinja_env.filters['datetime'] = format_datetime
+bp.add_app_template_filter(format_datetime, 'datetime')
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('pages/home.html')
 
 # SECTION HELPERS
 
 
-def distribute_shows(venue_shows):
+def partition_shows(shows, now=None):
+    # Split already loaded shows into (upcoming, past) against a single `now`
+    # so every row in one page view is compared with the same instant.
+    if now is None:
+        now = datetime.utcnow()
     upcoming_shows, past_shows = [], []
-    for show_id in venue_shows:
-        show_date = Show.query.filter_by(
-            id=show_id.id).first().start_time
-        show_date = (str(show_date).split())[0]
-        show_date = time.mktime(
-            datetime.strptime(show_date, "%Y-%m-%d").timetuple())
-        if Show.query.filter_by(id=show_id.id).first().start_time > datetime.utcnow():
-            upcoming_shows.append(show_id)
+    for show in shows:
+        if show.start_time > now:
+            upcoming_shows.append(show)
         else:
-            past_shows.append(show_id)
+            past_shows.append(show)
     return upcoming_shows, past_shows
 
 
-def format_artist_shows(shows):
+def venue_shows_query(venue_id):
+    # One joined round trip for every show of a venue, with the artist
+    # columns the detail page needs, regardless of how many shows exist.
+    # With SHOW_SUMMARY_VIEWS the join is precomputed in a materialized view.
+    # The *_query builders are shared with the async read path in asgi.py,
+    # which executes their .statement.
+    if current_app.config['SHOW_SUMMARY_VIEWS']:
+        summary = venue_show_summary.c
+        return db.session.query(
+            summary.start_time, summary.artist_id,
+            summary.artist_name, summary.artist_image_link,
+        ).filter(summary.venue_id == venue_id)\
+            .order_by(summary.start_time)
+    return db.session.query(
+        Show.start_time,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).join(Artist, Show.artist_id == Artist.id)\
+        .filter(Show.venue_id == venue_id)\
+        .order_by(Show.start_time)
+
+
+def query_venue_shows(venue_id):
+    return venue_shows_query(venue_id).all()
+
+
+def artist_shows_query(artist_id):
+    if current_app.config['SHOW_SUMMARY_VIEWS']:
+        summary = artist_show_summary.c
+        return db.session.query(
+            summary.start_time, summary.venue_id,
+            summary.venue_name, summary.venue_image_link,
+        ).filter(summary.artist_id == artist_id)\
+            .order_by(summary.start_time)
+    return db.session.query(
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+    ).join(Venue, Show.venue_id == Venue.id)\
+        .filter(Show.artist_id == artist_id)\
+        .order_by(Show.start_time)
+
+
+def query_artist_shows(artist_id):
+    return artist_shows_query(artist_id).all()
+
+
+def format_start_times(shows, iso=False):
+    # Pages show babel-formatted times; the JSON API returns ISO 8601.
+    if iso:
+        return [show.start_time.isoformat() for show in shows]
+    return format_datetimes([show.start_time for show in shows], 'full')
+
+
+def format_artist_shows(shows, iso=False):
     result = []
-    for show in shows:
+    start_times = format_start_times(shows, iso)
+    for show, start_time in zip(shows, start_times):
         temp = {}
         temp['venue_id'] = show.venue_id
-        temp['start_time'] = format_datetime(str(show.start_time))
-        venue = Venue.query.get(show.venue_id)
-        temp['venue_name'] = venue.name
-        temp['venue_image_link'] = venue.image_link
+        temp['start_time'] = start_time
+        temp['venue_name'] = show.venue_name
+        temp['venue_image_link'] = show.venue_image_link
         result.append(temp)
     return result
 
 
-def format_venue_shows(shows):
+def format_venue_shows(shows, iso=False):
     result = []
-    for show in shows:
+    start_times = format_start_times(shows, iso)
+    for show, start_time in zip(shows, start_times):
         temp = {}
         temp['artist_id'] = show.artist_id
-        selected_artist = Artist.query.get(show.artist_id)
-        temp['artist_name'] = selected_artist.name
-        temp['start_time'] = format_datetime(
-            str(show.start_time))
-        temp['artist_image_link'] = selected_artist.image_link
+        temp['artist_name'] = show.artist_name
+        temp['start_time'] = start_time
+        temp['artist_image_link'] = show.artist_image_link
         result.append(temp)
     return result
 
-#  SECTION Venues
-#  ----------------------------------------------------------------
 
+def encode_cursor(*values):
+    # Opaque, URL-safe keyset cursor holding the sort key of the last row.
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
 
-@app.route('/venues')
-def venues():
-    received_venues = Venue.query.all()
-    data = {}
-    for venue in received_venues:
-        upcoming_shows, past_shows = distribute_shows(venue.venue_shows)
 
-        if venue.state not in data:
-            data[venue.state] = {'city': venue.city, 'state': venue.state, 'venues': [{
-                'id': venue.id, 'name': venue.name, 'num_upcoming_shows': len(upcoming_shows)}]}
-        else:
-            data[venue.state]['venues'].append({
-                'id': venue.id, 'name': venue.name, 'num_upcoming_shows': len(upcoming_shows)
-            })
-    return render_template('pages/venues.html', areas=data.values())
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        abort(400)
 
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    search_term = "%{0}%".format(request.form['search_term'])
-    results = Venue.query.filter(Venue.name.ilike(search_term)).all()
-    response = {
+def keyset_query(query, order_by, after, limit):
+    # One page strictly after the `after` sort key; one extra row tells
+    # whether another page follows without a COUNT(*). The key comes from
+    # the client, so anything but one value of the column's type per sort
+    # column is a bad request rather than a failed query.
+    if after is not None:
+        if not isinstance(after, (list, tuple)) or len(after) != len(order_by) or \
+                not all(isinstance(value, column.type.python_type)
+                        for value, column in zip(after, order_by)):
+            abort(400)
+        query = query.filter(db.tuple_(*order_by) > tuple(after))
+    return query.order_by(*order_by).limit(limit + 1)
+
+
+def split_page(rows, limit):
+    if len(rows) > limit:
+        return rows[:limit], True
+    return rows, False
+
+
+def keyset_page(query, order_by, after, limit):
+    return split_page(keyset_query(query, order_by, after, limit).all(), limit)
+
+
+def parse_letter(letter):
+    # Alphabetical jump index: a single letter, or None when absent/invalid.
+    if letter and len(letter) == 1 and letter.isalpha():
+        return letter.upper()
+    return None
+
+
+# Genre names as offered by the create forms, keyed case-insensitively so a
+# search term can be matched against the stored genres array.
+@lru_cache(maxsize=None)
+def genre_names():
+    from forms import VenueForm
+    return {value.lower(): value for value,
+            _ in VenueForm.genres.kwargs['choices']}
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_query(model, term, limit=None):
+    # Name search served by the pg_trgm GIN index: substring (ILIKE) and
+    # fuzzy (%) matches, ranked by trigram similarity and capped at `limit`.
+    # A "City, ST" term also matches location, and a genre name matches
+    # entities listing that genre.
+    limit = limit or current_app.config['SEARCH_RESULTS_LIMIT']
+    term = term.strip()
+    criteria = [model.name.ilike('%{0}%'.format(escape_like(term))),
+                model.name.op('%')(term)]
+    city, _, state = term.rpartition(',')
+    if city and state.strip():
+        criteria.append(db.and_(db.func.lower(model.city) == city.strip().lower(),
+                                model.state == state.strip().upper()))
+    genre = genre_names().get(term.lower())
+    if genre is not None:
+        criteria.append(model.genres.contains([genre]))
+    return model.query.with_entities(model.id, model.name)\
+        .filter(db.or_(*criteria))\
+        .order_by(db.func.similarity(model.name, term).desc(), model.name)\
+        .limit(limit)
+
+
+def search_entities(model, term, limit=None):
+    return search_query(model, term, limit).all()
+
+
+def search_results(results):
+    return {
         "count": len(results),
         "data": [{
             "id": result.id,
             "name": result.name,
-        }for result in results]
+        } for result in results]
     }
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
-    upcoming_shows, past_shows = distribute_shows(venue.venue_shows)
+# Typeahead indexes are filled from the database on first use and then kept
+# current by the create handlers. create_app() sizes them from the config.
+typeahead_indexes = {
+    'artist': PrefixIndex('artist'),
+    'venue': PrefixIndex('venue'),
+}
+
+
+def get_typeahead_index(kind):
+    index = typeahead_indexes[kind]
+    if not index.loaded:
+        model = Artist if kind == 'artist' else Venue
+        with primary_reads():
+            index.load(model.query.with_entities(model.id, model.name).all())
+    return index
+
+
+# Rendered venue/artist detail pages, keyed by ('venue'|'artist', id). Writes
+# drop exactly the pages whose content they change; the TTL bounds how long a
+# show can stay listed as upcoming after it has started. Sized from the config
+# by create_app().
+page_cache = PageCache()
+
+
+def cached_page(kind, arg):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # Pages carrying flashed messages are user specific.
+            if session.get('_flashes'):
+                return view(**kwargs)
+            key = (kind, kwargs[arg])
+            page = page_cache.get(key)
+            if page is None:
+                with primary_reads():
+                    page = view(**kwargs)
+                page_cache.set(key, page)
+            return page
+        return wrapper
+    return decorator
+
+
+def invalidate_pages(venue_ids=(), artist_ids=()):
+    for venue_id in venue_ids:
+        page_cache.invalidate(('venue', int(venue_id)))
+    for artist_id in artist_ids:
+        page_cache.invalidate(('artist', int(artist_id)))
+
+
+# Per-genre entity counts for the search page facets, computed once with an
+# unnest/GROUP BY and then kept current by the create handlers.
+genre_facets = {'artist': None, 'venue': None}
+
+# Snapshot each count was loaded from, as (xmin, xmax, in-progress xids). A
+# change committed before it is already counted and must not be added again.
+genre_facet_snapshots = {'artist': None, 'venue': None}
+
+
+def genre_facets_query(kind):
+    # The snapshot is read in the same statement, so it is the one the
+    # counts were taken from.
+    model = Artist if kind == 'artist' else Venue
+    genre = db.func.unnest(model.genres).label('genre')
+    return db.session.query(genre, db.func.count().label('count'),
+                            db.func.txid_current_snapshot().label('snapshot'))\
+        .group_by(db.literal_column('genre'))
+
+
+def parse_snapshot(snapshot):
+    xmin, xmax, running = str(snapshot).split(':')
+    return int(xmin), int(xmax), {int(xid) for xid in running.split(',') if xid}
+
+
+def load_genre_facets(kind, rows):
+    # No rows means nothing was counted, so every later change applies.
+    genre_facet_snapshots[kind] = parse_snapshot(rows[0].snapshot) if rows else None
+    genre_facets[kind] = {row.genre: row.count for row in rows}
+
+
+def get_genre_facets(kind):
+    if genre_facets[kind] is None:
+        with primary_reads():
+            load_genre_facets(kind, genre_facets_query(kind).all())
+    return sorted(genre_facets[kind].items(), key=lambda item: (-item[1], item[0]))
+
+
+def increment_genre_facets(kind, genres, xid=None):
+    facets = genre_facets[kind]
+    if facets is None:
+        return
+    snapshot = genre_facet_snapshots[kind]
+    if xid is not None and snapshot is not None:
+        xmin, xmax, running = snapshot
+        if xid < xmin or (xid < xmax and xid not in running):
+            return
+    for genre in genres:
+        facets[genre] = facets.get(genre, 0) + 1
+
+
+# Cross-worker invalidation: every write queues a change notification on its
+# own transaction (Postgres NOTIFY), and a listener thread in each worker
+# applies the changes it receives to that worker's in-memory caches. A change
+# is a dict with optional 'venue_ids', 'artist_ids', 'venue_areas' and
+# 'typeahead' ([kind, id, name]) keys.
+
+
+# Ids of recently applied changes: a worker sees its own writes both locally
+# and over NOTIFY, and counters must only be bumped once. The request thread
+# and the listener thread can apply the same change at the same time, so the
+# check and the apply happen under one lock.
+applied_changes = OrderedDict()
+applied_changes_lock = Lock()
+
+# Changes naming more venues and artists than this reset the caches instead,
+# keeping the NOTIFY payload well under Postgres' 8000 byte limit.
+MAX_CHANGE_IDS = 500
+
+
+def apply_change(change):
+    with applied_changes_lock:
+        if change.get('id') in applied_changes:
+            return
+        applied_changes[change.get('id')] = True
+        while len(applied_changes) > 1000:
+            applied_changes.popitem(last=False)
+        if change.get('reset'):
+            reset_caches()
+            return
+        if change.get('genres'):
+            kind, genres = change['genres']
+            increment_genre_facets(kind, genres, change.get('xid'))
+        if change.get('venue_areas'):
+            invalidate_venue_areas()
+        if change.get('pages'):
+            page_cache.clear()
+        invalidate_pages(change.get('venue_ids', ()), change.get('artist_ids', ()))
+        if change.get('typeahead'):
+            kind, id, name = change['typeahead']
+            typeahead_indexes[kind].add(id, name)
+
+
+def reset_caches():
+    invalidate_venue_areas()
+    page_cache.clear()
+    for index in typeahead_indexes.values():
+        index.loaded = False
+    for kind in genre_facets:
+        genre_facets[kind] = None
+
+
+def publish_change(**change):
+    change['id'] = uuid.uuid4().hex
+    if 'genres' in change:
+        # Lets workers tell whether their facet counts already include it.
+        change['xid'] = db.session.execute(db.text('SELECT txid_current()')).scalar()
+    if has_request_context():
+        pin_to_primary()
+    notify(db.session, current_app.config['INVALIDATION_CHANNEL'], change)
+    return change
+
+
+def publish_pages_change(venue_ids, artist_ids, **change):
+    # publish_change() for the pages of `venue_ids` and `artist_ids`, or a
+    # reset when there are too many of them to send.
+    if len(venue_ids) + len(artist_ids) > MAX_CHANGE_IDS:
+        return publish_change(reset=True)
+    return publish_change(venue_ids=venue_ids, artist_ids=artist_ids, **change)
+
+
+def connect_listener(uri):
+    # Runs on the listener thread, outside any app context.
+    import psycopg2
+    url = make_url(uri)
+    args = url.translate_connect_args(username='user', database='dbname')
+    args.update(url.query)
+    return psycopg2.connect(**args)
+
+
+@bp.before_app_request
+def start_invalidation_listener():
+    if current_app.config['INVALIDATION_LISTENER']:
+        current_app.extensions['invalidation_listener'].ensure_started()
+
+
+# Columns written by /export and `flask export-data`, in output order.
+EXPORT_COLUMNS = {
+    'shows': ['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name'],
+    'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+               'facebook_link', 'website', 'seeking_talent', 'seeking_description'],
+    'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+                'facebook_link', 'website', 'seeking_venue', 'seeking_description'],
+}
+
+
+def query_export(kind, after=None):
+    # Rows are streamed from a server-side cursor in id order; a client that
+    # got cut off resumes with the last id it received as `after`.
+    if kind == 'shows':
+        query = db.session.query(
+            Show.id, Show.start_time,
+            Show.venue_id, Venue.name.label('venue_name'),
+            Show.artist_id, Artist.name.label('artist_name'),
+        ).join(Venue, Show.venue_id == Venue.id)\
+            .join(Artist, Show.artist_id == Artist.id)
+        model = Show
+    else:
+        model = Venue if kind == 'venues' else Artist
+        query = db.session.query(
+            *[getattr(model, column) for column in EXPORT_COLUMNS[kind]])
+    if after is not None:
+        query = query.filter(model.id > after)
+    return query.order_by(model.id)\
+        .execution_options(stream_results=True)\
+        .yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+
+
+def apply_show_counts(model, deltas):
+    # deltas: {entity id: (upcoming delta, past delta)}, applied with a single
+    # executemany UPDATE that also bumps updated_at.
+    if not deltas:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update().where(table.c.id == db.bindparam('entity_id')).values(
+            upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+            past_shows_count=table.c.past_shows_count + db.bindparam('past'),
+            updated_at=datetime.utcnow()),
+        [{'entity_id': id, 'upcoming': upcoming, 'past': past}
+         for id, (upcoming, past) in deltas.items()])
+
+
+def count_shows(shows, delta=1):
+    # Add created (delta=1) or remove deleted (delta=-1) shows, given as
+    # (venue_id, artist_id, start_time), to the venue and artist counters in
+    # the caller's transaction. The shared lock on show_rollover keeps the
+    # upcoming/past decision consistent with a concurrent rollover.
+    last_run = db.session.query(ShowRollover.last_run)\
+        .with_for_update(read=True).scalar()
+    venue_deltas, artist_deltas = {}, {}
+    for venue_id, artist_id, start_time in shows:
+        upcoming = start_time > last_run
+        for deltas, id in ((venue_deltas, venue_id), (artist_deltas, artist_id)):
+            counts = deltas.get(id, (0, 0))
+            deltas[id] = (counts[0] + delta, counts[1]) if upcoming \
+                else (counts[0], counts[1] + delta)
+    apply_show_counts(Venue, venue_deltas)
+    apply_show_counts(Artist, artist_deltas)
+
+
+def rollover_shows(now=None):
+    # Move shows that started since the last run from the upcoming to the
+    # past counters; returns the affected venue and artist ids.
+    if now is None:
+        now = datetime.utcnow()
+    rollover = ShowRollover.query.with_for_update().one()
+    started = db.and_(Show.start_time > rollover.last_run, Show.start_time <= now)
+    affected = {}
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        rows = db.session.query(column, db.func.count())\
+            .filter(started).group_by(column).all()
+        apply_show_counts(model, {id: (-count, count) for id, count in rows})
+        affected[model] = [id for id, _ in rows]
+    rollover.last_run = now
+    return affected[Venue], affected[Artist]
+
+
+def conditional_json(stamp, build):
+    # `stamp` is a tuple of cheap freshness values (update stamps, the
+    # latest show start that has passed). The ETag is derived from it and
+    # the request URL, so a matching If-None-Match is answered with 304
+    # before `build` runs any of the heavy queries.
+    #
+    # Listings are stamped with max(updated_at) alone, an index lookup. Rows
+    # are never deleted, so it covers additions too; deletes, if added, need
+    # a stamp of their own to bump rather than a count over the table.
+    etag = hashlib.sha1(repr((request.full_path,) + tuple(stamp)).encode()).hexdigest()
+    last_modified = max([value for value in stamp if isinstance(value, datetime)],
+                        default=None)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = last_modified is not None and request.if_modified_since is not None \
+            and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    response = Response(status=304) if not_modified else jsonify(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def latest_past_start(now, *criteria):
+    # The upcoming/past split last changed when the latest show that has
+    # already started did; served by the (…, start_time) indexes.
+    return db.session.query(db.func.max(Show.start_time))\
+        .filter(Show.start_time <= now, *criteria).scalar_subquery()
+
+
+def refresh_show_summaries(app, venue_ids=None, artist_ids=None):
+    # `venue_ids` and `artist_ids` are the entities whose shows the writes
+    # behind this refresh changed. Without them (the CLI refresh), the views
+    # are diffed to find out.
+    with app.app_context():
+        with db.engine.begin() as connection:
+            changed = refresh_summaries(connection, app.config['SHOW_SUMMARY_REFRESH_TIMEOUT_MS'],
+                                        diff=venue_ids is None)
+            if changed is not None:
+                venue_ids = changed['venue_show_summary']
+                artist_ids = changed['artist_show_summary']
+            venue_ids, artist_ids = sorted(venue_ids), sorted(artist_ids)
+            # Detail pages and their API ETags are stamped with updated_at,
+            # which the write behind the refresh bumped before the views
+            # caught up; bump it again in the refresh transaction.
+            for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+                if ids:
+                    connection.execute(model.__table__.update()
+                                       .where(model.id.in_(ids))
+                                       .values(updated_at=datetime.utcnow()))
+        if not venue_ids and not artist_ids:
+            return
+        change = publish_pages_change(venue_ids, artist_ids)
+        db.session.commit()
+        apply_change(change)
+
+
+def refresh_summaries_after_write(venue_ids, artist_ids):
+    if current_app.config['SHOW_SUMMARY_VIEWS'] and current_app.config['SHOW_SUMMARY_REFRESH_AFTER_WRITES']:
+        current_app.extensions['summary_refresher'].request(venue_ids, artist_ids)
+
+
+#  SECTION Venues
+#  ----------------------------------------------------------------
+
+
+def query_venue_areas(after=None, letter=None, limit=None):
+    # One page of venues with their denormalized upcoming show count, without
+    # touching the show table. Rows are keyset-paginated on
+    # (state, city, name, id) so consecutive rows share the same area and the
+    # page is an ordered index scan; `letter` jumps to the first state
+    # starting at that letter.
+    limit = limit or current_app.config['VENUES_PER_PAGE']
+    query = db.session.query(
+        Venue.city, Venue.state, Venue.id, Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'),
+    )
+    if after is None and letter is not None:
+        query = query.filter(Venue.state >= letter)
+    rows, has_more = keyset_page(
+        query, (Venue.state, Venue.city, Venue.name, Venue.id), after, limit)
+
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({'city': city, 'state': state, 'venues': [{
+            'id': venue.id, 'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows} for venue in venues]})
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.state, last.city, last.name, last.id)
+    return areas, next_cursor
+
+
+# The first page of the grouped listing is memoized until the next venue or
+# show write, or the next `flask rollover-shows`, which moves started shows
+# out of the upcoming counts. Deeper pages are cheap keyset scans and are
+# not cached.
+venue_areas_cache = {'page': None, 'expires_at': 0}
+
+
+def get_venue_areas(after=None, letter=None):
+    if after is not None or letter is not None:
+        return query_venue_areas(after, letter)
+    if venue_areas_cache['page'] is None or venue_areas_cache['expires_at'] < time.time():
+        with primary_reads():
+            venue_areas_cache['page'] = query_venue_areas()
+        venue_areas_cache['expires_at'] = time.time() + \
+            current_app.config['VENUE_AREAS_CACHE_TTL']
+    return venue_areas_cache['page']
+
+
+def invalidate_venue_areas():
+    venue_areas_cache['page'] = None
+
+
+@bp.route('/venues')
+@replica_read
+def venues():
+    after = request.args.get('after')
+    letter = parse_letter(request.args.get('letter'))
+    areas, next_cursor = get_venue_areas(
+        decode_cursor(after) if after else None, letter)
+    return render_template('pages/venues.html', areas=areas,
+                           next_cursor=next_cursor, letter=letter)
+
+
+@bp.route('/search/suggest')
+@replica_read
+def search_suggest():
+    kind = request.args.get('kind', 'artist')
+    if kind not in typeahead_indexes:
+        abort(400)
+    limit = min(request.args.get('k', 10, type=int),
+                current_app.config['TYPEAHEAD_MAX_RESULTS'])
+    suggestions = get_typeahead_index(kind).search(
+        request.args.get('q', ''), limit)
+    return jsonify(suggestions)
+
+
+@bp.route('/venues/search', methods=['POST'])
+@replica_read
+def search_venues():
+    results = search_entities(Venue, request.form['search_term'])
+    return render_template('pages/search_venues.html', results=search_results(results), search_term=request.form.get('search_term', ''),
+                           facets=get_genre_facets('venue'))
+
+
+def get_venue_data(venue_id, iso=False):
+    venue = Venue.query.get_or_404(venue_id)
+    upcoming_shows, past_shows = partition_shows(query_venue_shows(venue_id))
+    return venue_data(venue, upcoming_shows, past_shows, iso)
+
+
+def venue_data(venue, upcoming_shows, past_shows, iso=False):
     upcoming_shows, past_shows = format_venue_shows(
-        upcoming_shows), format_venue_shows(past_shows)
+        upcoming_shows, iso), format_venue_shows(past_shows, iso)
 
     data = {
         "id": venue.id,
@@ -224,19 +851,27 @@ def show_venue(venue_id):
         "past_shows_count": len(past_shows),
         "upcoming_shows_count": len(upcoming_shows),
     }
-    return render_template('pages/show_venue.html', venue=data)
+    return data
+
+
+@bp.route('/venues/<int:venue_id>')
+@cached_page('venue', 'venue_id')
+@replica_read
+def show_venue(venue_id):
+    return render_template('pages/show_venue.html', venue=get_venue_data(venue_id))
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     data = {}
     try:
@@ -261,7 +896,12 @@ def create_venue_submission():
                       seeking_talent=data['seeking_talent'],
                       genres=data['genres'])
         db.session.add(venue)
+        db.session.flush()
+        change = publish_change(venue_areas=True,
+                                typeahead=['venue', venue.id, venue.name],
+                                genres=['venue', venue.genres])
         db.session.commit()
+        apply_change(change)
         flash('Venue ' + data['name'] + ' was successfully listed!')
 
     except:
@@ -274,7 +914,7 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -285,34 +925,48 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-    artists = Artist.query.with_entities(Artist.id, Artist.name).all()
-
+def get_artists_page(after=None, letter=None):
+    query = Artist.query.with_entities(Artist.id, Artist.name)
+    if not after and letter is not None:
+        query = query.filter(Artist.name >= letter)
+    artists, has_more = keyset_page(
+        query, (Artist.name, Artist.id),
+        decode_cursor(after) if after else None,
+        current_app.config['ARTISTS_PER_PAGE'])
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(artists[-1].name, artists[-1].id)
     data = [{'id': artist.id, 'name': artist.name} for artist in artists]
-    return render_template('pages/artists.html', artists=data)
+    return data, next_cursor
+
+
+@bp.route('/artists')
+@replica_read
+def artists():
+    letter = parse_letter(request.args.get('letter'))
+    data, next_cursor = get_artists_page(request.args.get('after'), letter)
+    return render_template('pages/artists.html', artists=data,
+                           next_cursor=next_cursor, letter=letter)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
+@replica_read
 def search_artists():
-    search_term = "%{0}%".format(request.form['search_term'])
-    results = Artist.query.filter(Artist.name.ilike(search_term)).all()
-    response = {
-        "count": len(results),
-        "data": [{
-            "id": result.id,
-            "name": result.name,
-        }for result in results]}
+    results = search_entities(Artist, request.form['search_term'])
+    return render_template('pages/search_artists.html', results=search_results(results), search_term=request.form.get('search_term', ''),
+                           facets=get_genre_facets('artist'))
 
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
+def get_artist_data(artist_id, iso=False):
+    artist = Artist.query.get_or_404(artist_id)
+    upcoming_shows, past_shows = partition_shows(query_artist_shows(artist_id))
+    return artist_data(artist, upcoming_shows, past_shows, iso)
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
-    upcoming_shows, past_shows = distribute_shows(artist.artist_shows)
+
+def artist_data(artist, upcoming_shows, past_shows, iso=False):
     upcoming, past = format_artist_shows(
-        upcoming_shows), format_artist_shows(past_shows)
+        upcoming_shows, iso), format_artist_shows(past_shows, iso)
 
     data = {
         "id": artist.id,
@@ -331,13 +985,20 @@ def show_artist(artist_id):
         "past_shows_count": len(past),
         "upcoming_shows_count": len(upcoming),
     }
+    return data
+
 
-    return render_template('pages/show_artist.html', artist=data)
+@bp.route('/artists/<int:artist_id>')
+@cached_page('artist', 'artist_id')
+@replica_read
+def show_artist(artist_id):
+    return render_template('pages/show_artist.html', artist=get_artist_data(artist_id))
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
     artist = {
         "id": 4,
@@ -356,16 +1017,17 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
+    from forms import VenueForm
     form = VenueForm()
     venue = {
         "id": 1,
@@ -385,23 +1047,24 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     data = {}
     try:
@@ -429,7 +1092,11 @@ def create_artist_submission():
                         seeking_venue=data['seeking_venue'],
                         genres=data['genres'], seeking_description=data['seeking_description'])
         db.session.add(artist)
+        db.session.flush()
+        change = publish_change(typeahead=['artist', artist.id, artist.name],
+                                genres=['artist', artist.genres])
         db.session.commit()
+        apply_change(change)
         flash('Artist ' + data['name'] + ' was successfully listed!')
 
     except:
@@ -442,39 +1109,119 @@ def create_artist_submission():
     return render_template('pages/home.html')
 
 
+#  Genres
+#  ----------------------------------------------------------------
+
+@bp.route('/genres/<genre>')
+@replica_read
+def show_genre(genre):
+    # Array containment (genres @> ARRAY[genre]) is served by the GIN
+    # indexes on artist.genres and venue.genres.
+    genre = genre_names().get(genre.lower())
+    if genre is None:
+        abort(404)
+    limit = current_app.config['GENRE_RESULTS_PER_PAGE']
+    data = {'genre': genre}
+    for kind, model in (('artist', Artist), ('venue', Venue)):
+        after = request.args.get(kind + 's_after')
+        rows, has_more = keyset_page(
+            model.query.with_entities(model.id, model.name)
+            .filter(model.genres.contains([genre])),
+            (model.name, model.id),
+            decode_cursor(after) if after else None, limit)
+        data[kind + 's'] = [{'id': row.id, 'name': row.name} for row in rows]
+        data[kind + 's_next'] = encode_cursor(
+            rows[-1].name, rows[-1].id) if has_more else None
+    return render_template('pages/genre.html', **data)
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+def shows_page_query(after, limit):
+    # Keyset pagination on (start_time, id): each page is a single indexed
+    # range scan, no matter how deep the client has paged.
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Show.artist_id,
+        Venue.name.label('venue_name'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+    ).join(Venue, Show.venue_id == Venue.id)\
+        .join(Artist, Show.artist_id == Artist.id)
+    if after is not None:
+        try:
+            start_time, show_id = after
+            start_time = datetime.fromisoformat(start_time)
+        except (ValueError, TypeError):
+            abort(400)
+        after = (start_time, show_id)
+    return keyset_query(query, (Show.start_time, Show.id), after, limit)
+
+
+def shows_page(rows, limit):
+    rows, has_more = split_page(rows, limit)
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(
+            rows[-1].start_time.isoformat(), rows[-1].id)
+    return rows, next_cursor
+
+
+def query_shows_page(after=None, limit=None):
+    limit = limit or current_app.config['SHOWS_PER_PAGE']
+    return shows_page(shows_page_query(after, limit).all(), limit)
+
+
+def format_shows(rows, iso=False):
+    start_times = format_start_times(rows, iso)
+    return [{'venue_id': show.venue_id,
+             'venue_name': show.venue_name,
+             'artist_id': show.artist_id,
+             'artist_name': show.artist_name,
+             'artist_image_link': show.artist_image_link,
+             'start_time': start_time} for show, start_time in zip(rows, start_times)]
+
+
+def get_shows_page(after=None, iso=False):
+    rows, next_cursor = query_shows_page(
+        decode_cursor(after) if after else None)
+    return format_shows(rows, iso), next_cursor
+
+
+@bp.route('/shows')
+@replica_read
 def shows():
-    shows = Show.query.all()
-
-    data = [{'venue_id': show.venue_id, 'artist_id': show.artist_id,
-             'start_time': format_datetime((str(show.start_time)))} for show in shows]
-    for item in data:
-        artist = Artist.query.get(item['artist_id'])
-        item['artist_name'] = artist.name
-        item['artist_image_link'] = artist.image_link
-        item['venue_name'] = Venue.query.get(item['venue_id']).name
-    return render_template('pages/shows.html', shows=data)
+    data, next_cursor = get_shows_page(request.args.get('after'))
+    return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 
-@app.route('/shows/create')
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
+    from forms import ShowForm
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
+    import dateutil.parser
     body = request.form
     print(body)
     try:
-        show = Show(start_time=body['start_time'],
+        show = Show(start_time=dateutil.parser.parse(body['start_time']),
                     artist_id=body['artist_id'], venue_id=body['venue_id'])
         db.session.add(show)
+        count_shows([(show.venue_id, show.artist_id, show.start_time)])
+        change = publish_change(venue_areas=True,
+                                venue_ids=[int(body['venue_id'])],
+                                artist_ids=[int(body['artist_id'])])
         db.session.commit()
+        apply_change(change)
+        refresh_summaries_after_write(change['venue_ids'], change['artist_ids'])
         flash('Show was successfully listed!')
     except:
         db.session.rollback()
@@ -487,26 +1234,337 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  JSON API
+#  ----------------------------------------------------------------
+
+@bp.route('/api/v1/venues')
+@replica_read
+def api_venues():
+    stamp = db.session.query(db.func.max(Venue.updated_at)).one()
+    letter = parse_letter(request.args.get('letter'))
+    after = request.args.get('after')
+
+    def build():
+        areas, next_cursor = query_venue_areas(
+            decode_cursor(after) if after else None, letter)
+        return {'areas': areas, 'next': next_cursor}
+    return conditional_json(stamp, build)
+
+
+@bp.route('/api/v1/venues/<int:venue_id>')
+@replica_read
+def api_venue(venue_id):
+    now = datetime.utcnow()
+    stamp = db.session.query(Venue.updated_at, latest_past_start(now, Show.venue_id == venue_id))\
+        .filter(Venue.id == venue_id).first_or_404()
+    return conditional_json(stamp, lambda: get_venue_data(venue_id, iso=True))
+
+
+@bp.route('/api/v1/artists')
+@replica_read
+def api_artists():
+    stamp = db.session.query(db.func.max(Artist.updated_at)).one()
+
+    def build():
+        data, next_cursor = get_artists_page(
+            request.args.get('after'), parse_letter(request.args.get('letter')))
+        return {'artists': data, 'next': next_cursor}
+    return conditional_json(stamp, build)
+
+
+@bp.route('/api/v1/artists/<int:artist_id>')
+@replica_read
+def api_artist(artist_id):
+    now = datetime.utcnow()
+    stamp = db.session.query(Artist.updated_at, latest_past_start(now, Show.artist_id == artist_id))\
+        .filter(Artist.id == artist_id).first_or_404()
+    return conditional_json(stamp, lambda: get_artist_data(artist_id, iso=True))
+
+
+@bp.route('/api/v1/shows')
+@replica_read
+def api_shows():
+    stamp = db.session.query(db.func.max(Show.updated_at)).one()
+
+    def build():
+        data, next_cursor = get_shows_page(request.args.get('after'), iso=True)
+        return {'shows': data, 'next': next_cursor}
+    return conditional_json(stamp, build)
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@bp.route('/export/<any(shows, venues, artists):kind>.<any(csv, ndjson):format>')
+@replica_read
+def export(kind, format):
+    after = request.args.get('after', type=int)
+
+    def generate():
+        # The query is built while streaming, on the session of the re-pushed
+        # context, so that session (and its connection) is removed when the
+        # stream ends. The view's own session is closed before streaming.
+        yield from serialize_rows(query_export(kind, after), EXPORT_COLUMNS[kind], format)
+    return Response(stream_with_context(generate()), mimetype=MIMETYPES[format])
+
+
+#  Images
+#  ----------------------------------------------------------------
+
+@bp.app_template_global()
+def thumbnail_url(url, width):
+    # Pages embed image_link through the proxy below, resized to `width`
+    # (one of IMAGE_PROXY_WIDTHS).
+    if not url:
+        return url
+    return url_for('main.image_proxy', width=width, url=url,
+                   signature=sign(current_app.config['SECRET_KEY'], url, width))
+
+
+@bp.route('/images/<int:width>')
+def image_proxy(width):
+    url = request.args.get('url', '')
+    signature = sign(current_app.config['SECRET_KEY'], url, width)
+    if width not in current_app.config['IMAGE_PROXY_WIDTHS'] or \
+            not hmac.compare_digest(request.args.get('signature', ''), signature):
+        abort(404)
+    thumbnails = current_app.extensions['thumbnails']
+    key = thumbnail_key(url, width)
+    data = thumbnails.get(key)
+    if data is None:
+        try:
+            data = make_thumbnail(fetch_image(
+                url, current_app.config['IMAGE_PROXY_TIMEOUT'],
+                current_app.config['IMAGE_PROXY_MAX_SOURCE_BYTES'],
+                current_app.config['IMAGE_PROXY_ALLOW_PRIVATE_HOSTS']), width)
+        except ImageError as e:
+            # Not cached, so the next request retries; meanwhile the browser
+            # can still try the original.
+            current_app.logger.warning('image proxy: %s', e)
+            return redirect(url)
+        thumbnails.set(key, data)
+    response = Response(data, mimetype=image_type(data))
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['IMAGE_PROXY_MAX_AGE']
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.route('/cache/stats')
+def cache_stats():
+    if not current_app.config['STATS_ENDPOINTS']:
+        abort(404)
+    return jsonify(page_cache.stats())
+
+
+@bp.route('/pool/stats')
+def pool_stats_view():
+    if not current_app.config['STATS_ENDPOINTS']:
+        abort(404)
+    return jsonify({key or 'primary': pool_stats(engine)
+                    for key, engine in db.engines.items()})
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# CLI.
+#----------------------------------------------------------------------------#
+
+def filter_show_references(rows):
+    # One existence query per referenced table for the whole batch, instead
+    # of letting a single bad foreign key abort the batch insert.
+    venue_ids = {row['venue_id'] for row in rows}
+    artist_ids = {row['artist_id'] for row in rows}
+    venue_ids = {id for id, in db.session.query(
+        Venue.id).filter(Venue.id.in_(venue_ids))}
+    artist_ids = {id for id, in db.session.query(
+        Artist.id).filter(Artist.id.in_(artist_ids))}
+    return [row for row in rows
+            if row['venue_id'] in venue_ids and row['artist_id'] in artist_ids]
+
+
+@bp.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['artist', 'venue', 'show']))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True)
+def import_data(kind, source, format, batch_size):
+    """Bulk load artists, venues or shows from a CSV or NDJSON file."""
+    from importer import batched, read_rows, validate_row
+    format = format or ('csv' if source.name.endswith('.csv') else 'ndjson')
+    model = {'artist': Artist, 'venue': Venue, 'show': Show}[kind]
+    loaded = rejected = 0
+    venue_ids, artist_ids = set(), set()
+    started = time.time()
+    for batch in batched(read_rows(source, format), batch_size):
+        rows = []
+        for row in batch:
+            values, errors = validate_row(kind, row)
+            if errors:
+                rejected += 1
+                click.echo('rejected {0!r}: {1}'.format(row, errors), err=True)
+                continue
+            if kind != 'show' and not values['image_link']:
+                values['image_link'] = model.image_link.default.arg
+            if kind == 'venue' and not values['seeking_description']:
+                values['seeking_description'] = model.seeking_description.default.arg
+            rows.append(values)
+        if kind == 'show' and rows:
+            valid = filter_show_references(rows)
+            if len(valid) < len(rows):
+                rejected += len(rows) - len(valid)
+                click.echo('rejected {0} shows with unknown venue or artist ids'.format(
+                    len(rows) - len(valid)), err=True)
+            rows = valid
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+            if kind == 'show':
+                count_shows([(row['venue_id'], row['artist_id'], row['start_time'])
+                             for row in rows])
+                venue_ids.update(row['venue_id'] for row in rows)
+                artist_ids.update(row['artist_id'] for row in rows)
+            db.session.commit()
+        loaded += len(rows)
+        click.echo('{0} rows loaded, {1} rejected ({2:.0f} rows/s)'.format(
+            loaded, rejected, loaded / max(time.time() - started, 1e-6)))
+
+    # Bulk loads touch too many entities to invalidate one by one.
+    change = publish_change(reset=True)
+    db.session.commit()
+    apply_change(change)
+    if kind == 'show' and current_app.config['SHOW_SUMMARY_VIEWS'] and \
+            current_app.config['SHOW_SUMMARY_REFRESH_AFTER_WRITES']:
+        # In the foreground: a refresher thread would not outlive the command.
+        refresh_show_summaries(current_app._get_current_object(), venue_ids, artist_ids)
+
+
+@bp.cli.command('export-data')
+@click.argument('kind', type=click.Choice(['shows', 'venues', 'artists']))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--after', type=int, help='Resume after this id.')
+@click.option('--output', '-o', type=click.File('w'), default='-')
+def export_data(kind, format, after, output):
+    """Stream artists, venues or shows to CSV or NDJSON."""
+    for line in serialize_rows(query_export(kind, after), EXPORT_COLUMNS[kind], format):
+        output.write(line)
+
+
+@bp.cli.command('rollover-shows')
+@click.option('--interval', type=int,
+              help='Keep running, rolling over every INTERVAL seconds.')
+def rollover_shows_command(interval):
+    """Move shows that have started from upcoming to past counters."""
+    while True:
+        venue_ids, artist_ids = rollover_shows()
+        change = publish_pages_change(venue_ids, artist_ids, venue_areas=True)
+        db.session.commit()
+        apply_change(change)
+        click.echo('rolled over shows at {0} venues and {1} artists'.format(
+            len(venue_ids), len(artist_ids)))
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@bp.cli.command('refresh-show-summaries')
+@click.option('--interval', type=int,
+              help='Keep running, refreshing every INTERVAL seconds.')
+def refresh_show_summaries_command(interval):
+    """Refresh the venue/artist show summary materialized views."""
+    while True:
+        started = time.time()
+        refresh_show_summaries(current_app._get_current_object())
+        click.echo('refreshed show summaries in {0:.2f}s'.format(time.time() - started))
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, minify and precompress static/ for production."""
+    started = time.time()
+    stats = assets.build(current_app.static_folder, current_app.config['STATIC_MANIFEST'])
+    click.echo('built {0} assets ({1} precompressed, {2:.0f} KB) in {3:.2f}s'.format(
+        stats['files'], stats['compressed'], stats['bytes'] / 1024, time.time() - started))
+
+
+#----------------------------------------------------------------------------#
+# App factory.
+#----------------------------------------------------------------------------#
+
+# Apps built by create_app(), held weakly so the fork hook below does not
+# keep discarded ones (tests, benchmarks) alive.
+created_apps = weakref.WeakSet()
+
+
+def dispose_engines():
+    # A worker forked from a preloaded master (`gunicorn --preload`)
+    # inherits the master's pooled connections. Two processes must never
+    # share a socket, so the child drops them without closing them and
+    # opens its own.
+    for app in list(created_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_engines)
+
+
+def create_app(config_object='config'):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    db.init_app(app)
+    moment.init_app(app)
+    # Alembic is only needed by `flask db`, so web workers skip importing it.
+    click_context = click.get_current_context(silent=True)
+    if click_context is not None and click_context.find_object(ScriptInfo) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    app.register_blueprint(bp)
+    assets.init_app(app)
+
+    page_cache.max_entries = app.config['PAGE_CACHE_MAX_ENTRIES']
+    page_cache.ttl = app.config['PAGE_CACHE_TTL']
+    for index in typeahead_indexes.values():
+        index.max_entries = app.config['TYPEAHEAD_MAX_ENTRIES']
+    app.extensions['invalidation_listener'] = InvalidationListener(
+        partial(connect_listener, app.config['INVALIDATION_DATABASE_URI']),
+        app.config['INVALIDATION_CHANNEL'], apply_change, reset_caches)
+    app.extensions['summary_refresher'] = BackgroundRefresher(
+        partial(refresh_show_summaries, app))
+    app.extensions['thumbnails'] = ThumbnailCache(
+        app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'])
+
+    if app.config['SQL_INSTRUMENTATION']:
+        instrumentation.init_app(app)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+        instrumentation.logger.setLevel(logging.INFO)
+        instrumentation.logger.addHandler(file_handler)
+    created_apps.add(app)
+    return app
+
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -514,11 +1572,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,299 @@
+# ASGI entry point: `gunicorn -k uvicorn.workers.UvicornWorker asgi:application`.
+#
+# The heavy read routes (venue/artist detail, /shows and the two searches) run
+# as coroutines on async SQLAlchemy engines (asyncpg), so a worker keeps
+# serving other requests while they wait on Postgres. They build the same
+# queries as the sync views and render the same templates inside a regular
+# Flask request context. Every other route, including all writes, is the
+# unchanged WSGI app, run on a thread pool of ASGI_SYNC_THREADS.
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import wraps
+
+from flask import abort, g, render_template, request, session
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+import app as fyyur
+from app import Artist, Venue, create_app, db
+from routing import primary_reads, replica_read
+
+app = create_app()
+
+# Async engines by bind key (None is the primary), created on first use so
+# they belong to the serving event loop.
+async_engines = {}
+
+
+def get_async_engine():
+    # Same replica choice as the sync RoutingSession: replica_read picked a
+    # bind for this request, or it reads from the primary.
+    key = g.get('replica_bind')
+    if key not in async_engines:
+        uri = app.config['SQLALCHEMY_BINDS'][key] if key else \
+            app.config['SQLALCHEMY_DATABASE_URI']
+        if app.config['DB_PGBOUNCER']:
+            # asyncpg's prepared statement caches break under transaction
+            # pooling.
+            options = {'poolclass': NullPool, 'connect_args': {
+                'statement_cache_size': 0, 'prepared_statement_cache_size': 0}}
+        else:
+            options = {
+                'pool_size': app.config['ASYNC_DB_POOL_SIZE'],
+                'max_overflow': app.config['ASYNC_DB_MAX_OVERFLOW'],
+                'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+                'pool_recycle': app.config['DB_POOL_RECYCLE'],
+                'pool_pre_ping': True,
+                'connect_args': {'server_settings': {
+                    'statement_timeout': str(app.config['DB_STATEMENT_TIMEOUT_MS'])}},
+            }
+        async_engines[key] = create_async_engine(
+            fyyur.make_url(uri).set(drivername='postgresql+asyncpg'), **options)
+    return async_engines[key]
+
+
+async def fetch(query):
+    # Each call checks out its own connection, so fetches gathered together
+    # run as concurrent queries.
+    statement = getattr(query, 'statement', query)
+    async with get_async_engine().connect() as connection:
+        result = await connection.execute(statement)
+        return result.all()
+
+
+async def fetch_shows(query, now):
+    # The upcoming and past halves of a detail page, queried concurrently.
+    statement = query.statement
+    start_time = statement.selected_columns.start_time
+    return await asyncio.gather(fetch(statement.where(start_time > now)),
+                                fetch(statement.where(start_time <= now)))
+
+
+async def fetch_entity(model, id):
+    rows = await fetch(db.select(model.__table__).where(model.id == id))
+    if not rows:
+        abort(404)
+    return rows[0]
+
+
+async def get_genre_facets(kind):
+    if fyyur.genre_facets[kind] is None:
+        with primary_reads():
+            fyyur.load_genre_facets(kind, await fetch(fyyur.genre_facets_query(kind)))
+    return fyyur.get_genre_facets(kind)
+
+
+def cached_page(kind, arg):
+    # Async twin of app.cached_page, sharing its page cache.
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(**kwargs):
+            if session.get('_flashes'):
+                return await view(**kwargs)
+            key = (kind, kwargs[arg])
+            page = fyyur.page_cache.get(key)
+            if page is None:
+                with primary_reads():
+                    page = await view(**kwargs)
+                fyyur.page_cache.set(key, page)
+            return page
+        return wrapper
+    return decorator
+
+
+@cached_page('venue', 'venue_id')
+@replica_read
+async def show_venue(venue_id):
+    now = datetime.utcnow()
+    venue, (upcoming_shows, past_shows) = await asyncio.gather(
+        fetch_entity(Venue, venue_id),
+        fetch_shows(fyyur.venue_shows_query(venue_id), now))
+    return render_template('pages/show_venue.html', venue=fyyur.venue_data(
+        venue, upcoming_shows, past_shows))
+
+
+@cached_page('artist', 'artist_id')
+@replica_read
+async def show_artist(artist_id):
+    now = datetime.utcnow()
+    artist, (upcoming_shows, past_shows) = await asyncio.gather(
+        fetch_entity(Artist, artist_id),
+        fetch_shows(fyyur.artist_shows_query(artist_id), now))
+    return render_template('pages/show_artist.html', artist=fyyur.artist_data(
+        artist, upcoming_shows, past_shows))
+
+
+@replica_read
+async def shows():
+    after = request.args.get('after')
+    limit = app.config['SHOWS_PER_PAGE']
+    query = fyyur.shows_page_query(fyyur.decode_cursor(after) if after else None, limit)
+    rows, next_cursor = fyyur.shows_page(await fetch(query), limit)
+    return render_template('pages/shows.html', shows=fyyur.format_shows(rows),
+                           next_cursor=next_cursor)
+
+
+async def search(model, kind, template):
+    term = request.form['search_term']
+    results, facets = await asyncio.gather(
+        fetch(fyyur.search_query(model, term)), get_genre_facets(kind))
+    return render_template(template, results=fyyur.search_results(results),
+                           search_term=term, facets=facets)
+
+
+@replica_read
+async def search_venues():
+    return await search(Venue, 'venue', 'pages/search_venues.html')
+
+
+@replica_read
+async def search_artists():
+    return await search(Artist, 'artist', 'pages/search_artists.html')
+
+
+# Endpoints of app.py served by the coroutines above.
+ASYNC_VIEWS = {
+    'main.show_venue': show_venue,
+    'main.show_artist': show_artist,
+    'main.shows': shows,
+    'main.search_venues': search_venues,
+    'main.search_artists': search_artists,
+}
+
+
+def async_endpoint(scope):
+    adapter = app.url_map.bind('localhost')
+    try:
+        endpoint, _ = adapter.match(scope['path'], method=scope['method'])
+    except (NotFound, MethodNotAllowed):
+        return None
+    return endpoint if endpoint in ASYNC_VIEWS else None
+
+
+def build_environ(scope, body):
+    # WSGI environ for an ASGI HTTP request, with the body already read.
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+async def dispatch(environ):
+    # Flask's full_dispatch_request, with the view awaited: before/after
+    # request hooks (instrumentation, session, invalidation listener) and the
+    # error handlers apply as for the sync routes.
+    ctx = app.request_context(environ)
+    ctx.push()
+    error = None
+    try:
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await ASYNC_VIEWS[request.endpoint](**request.view_args)
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+        response = app.finalize_request(rv)
+    except Exception as e:
+        error = e
+        response = app.handle_exception(e)
+    finally:
+        ctx.pop(error)
+    return response
+
+
+def run_wsgi(loop, environ, send):
+    # Runs one sync request start to finish on a pool thread, so streamed
+    # responses (stream_with_context) push and pop their context on the
+    # thread that created it. Chunks are handed to the event loop as they
+    # are produced, waiting for each send for backpressure.
+    def send_sync(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    start = {}
+
+    def start_response(status, headers, exc_info=None):
+        start.update(type='http.response.start', status=int(status.split(' ', 1)[0]),
+                     headers=[(name.lower().encode('latin-1'), value.encode('latin-1'))
+                              for name, value in headers])
+
+    iterable = app(environ, start_response)
+    try:
+        send_sync(start)
+        for chunk in iterable:
+            if chunk and environ['REQUEST_METHOD'] != 'HEAD':
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        send_sync({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+sync_executor = ThreadPoolExecutor(app.config['ASGI_SYNC_THREADS'],
+                                   thread_name_prefix='wsgi')
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in async_engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    environ = build_environ(scope, await read_body(receive))
+    if async_endpoint(scope) is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(sync_executor, run_wsgi, loop, environ, send)
+
+    response = await dispatch(environ)
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    body = b'' if scope['method'] == 'HEAD' else response.get_data()
+    await send({'type': 'http.response.body', 'body': body})
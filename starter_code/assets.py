@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+# Types worth compressing; images and woff fonts are compressed already.
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt'}
+
+# Precompressed variants in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Relative references rewritten to hashed names: CSS url() and source maps.
+REFERENCES = {
+    '.css': re.compile(r'''(url\(\s*['"]?)([^'")]+)'''),
+    '.js': re.compile(r'(sourceMappingURL=)(\S+)'),
+}
+
+
+def minify_css(text):
+    # Comments and insignificant whitespace only. Spaces before ':' are kept,
+    # since `a :hover` and `a:hover` are different selectors.
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # Line-preserving, so automatic semicolon insertion still sees the same
+    # statements: drops indentation, blank lines and whole-line comments.
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def rewrite_references(text, name, manifest):
+    # Hashed files keep the source layout, so a relative reference only
+    # changes its file name.
+    pattern = REFERENCES.get(os.path.splitext(name)[1])
+    if pattern is None:
+        return text
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        path, rest = re.match(r'([^?#]*)(.*)', match.group(2)).groups()
+        if not path or ':' in path or path.startswith('/'):
+            return match.group(0)
+        target = manifest.get(posixpath.normpath(posixpath.join(directory, path)))
+        if target is None:
+            return match.group(0)
+        return match.group(1) + posixpath.join(
+            posixpath.dirname(path), posixpath.basename(target)) + rest
+    return pattern.sub(replace, text)
+
+
+def hashed_name(name, content):
+    stem, extension = os.path.splitext(name)
+    return '{0}.{1}{2}'.format(stem, hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+def compress(path, content):
+    # Writes .br and .gz next to `path` when they are smaller; returns the
+    # suffixes written.
+    import brotli
+    written = []
+    for suffix, data in (('.br', brotli.compress(content, quality=11)),
+                         ('.gz', gzip.compress(content, compresslevel=9, mtime=0))):
+        if len(data) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+            written.append(suffix)
+    return written
+
+
+def source_files(static_folder, output):
+    # Paths relative to the static folder, '/' separated. CSS and JS come
+    # last, so the files they reference are hashed before them.
+    names = []
+    for root, directories, files in os.walk(static_folder):
+        directories[:] = sorted(directory for directory in directories
+                                if not directory.startswith('.') and
+                                os.path.join(root, directory) != output)
+        for file in sorted(files):
+            if not file.startswith('.'):
+                names.append(os.path.relpath(os.path.join(root, file), static_folder)
+                             .replace(os.sep, '/'))
+    return sorted(names, key=lambda name: os.path.splitext(name)[1] in REFERENCES)
+
+
+def build(static_folder, manifest_path):
+    # Copies every file under static/ into the manifest's directory with its
+    # content hash in the name, minifying CSS and JS that are not .min
+    # already and precompressing text types. The manifest maps the source
+    # names to the hashed ones, both relative to the static folder.
+    output_name = posixpath.dirname(manifest_path)
+    output = os.path.join(static_folder, output_name)
+    shutil.rmtree(output, ignore_errors=True)
+    manifest, stats = {}, {'files': 0, 'bytes': 0, 'compressed': 0}
+    for name in source_files(static_folder, output):
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+        extension = os.path.splitext(name)[1]
+        if extension in REFERENCES:
+            text = content.decode('utf-8')
+            if extension in MINIFIERS and '.min.' not in name:
+                text = MINIFIERS[extension](text)
+            content = rewrite_references(text, name, manifest).encode('utf-8')
+        hashed = posixpath.join(output_name, hashed_name(name, content))
+        path = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if extension in COMPRESSIBLE:
+            stats['compressed'] += bool(compress(path, content))
+        manifest[name] = hashed
+        stats['files'] += 1
+        stats['bytes'] += len(content)
+    with open(os.path.join(static_folder, manifest_path), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return stats
+
+
+def load_manifest(static_folder, manifest_path):
+    try:
+        with open(os.path.join(static_folder, manifest_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def hashed_static_url(endpoint, values):
+    # url_for('static', filename='css/main.css') resolves to the hashed copy
+    # once `flask build-assets` has run.
+    if endpoint == 'static' and 'filename' in values:
+        manifest = current_app.extensions['static_manifest']
+        values['filename'] = manifest.get(values['filename'], values['filename'])
+
+
+def send_static_file(filename):
+    # Replaces Flask's static view. Hashed files never change under the same
+    # name, so they are cached for good and sent precompressed when the
+    # client accepts it; anything else is revalidated as before.
+    folder = current_app.static_folder
+    output_name = posixpath.dirname(current_app.config['STATIC_MANIFEST'])
+    if not filename.startswith(output_name + '/'):
+        return send_from_directory(folder, filename)
+    variants = [(encoding, suffix) for encoding, suffix in ENCODINGS
+                if os.path.isfile(safe_join(folder, filename + suffix) or '')]
+    for encoding, suffix in variants:
+        if encoding in request.accept_encodings:
+            response = send_from_directory(
+                folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0],
+                max_age=current_app.config['STATIC_IMMUTABLE_MAX_AGE'])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(
+            folder, filename, max_age=current_app.config['STATIC_IMMUTABLE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if variants:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    app.extensions['static_manifest'] = load_manifest(
+        app.static_folder, app.config['STATIC_MANIFEST'])
+    # Without a build the static files are served unchanged.
+    if app.extensions['static_manifest']:
+        app.url_defaults(hashed_static_url)
+        app.view_functions['static'] = send_static_file
@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta
+
+from forms import VenueForm
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Houston', 'TX'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Denver', 'CO'), ('Boston', 'MA'), ('Atlanta', 'GA'),
+]
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sol', 'de', 'ly', 'an',
+             'bel', 'chi', 'dor', 'ex', 'fa', 'gur', 'ho', 'jin', 'qua', 'zen']
+VENUE_WORDS = ['Hall', 'Club', 'Lounge', 'Theatre', 'Room', 'Bar', 'Arena', 'Garden']
+ARTIST_WORDS = ['Band', 'Trio', 'Collective', 'Quartet', 'Project', 'Orchestra']
+
+
+def weighted(rng, items, skew=1.1):
+    # Zipf-like choice: the first items are much more common than the last,
+    # as with real genre and city popularity.
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(items))]
+    return rng.choices(items, weights)[0]
+
+
+def make_name(rng, words):
+    word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    return '{0} {1}'.format(word.capitalize(), rng.choice(words))
+
+
+def make_genres(rng):
+    genres = {weighted(rng, GENRES) for _ in range(rng.randint(1, 3))}
+    return sorted(genres)
+
+
+def generate(venues=100, artists=300, shows=2000, seed=0, now=None):
+    # Deterministic for a given seed: returns lists of venue, artist and show
+    # dicts; show venue_id/artist_id are 1-based positions in those lists.
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    venue_rows, artist_rows, show_rows = [], [], []
+    for number in range(venues):
+        city, state = weighted(rng, CITIES)
+        venue_rows.append({
+            'name': make_name(rng, VENUE_WORDS), 'city': city, 'state': state,
+            'address': '{0} Main Street'.format(rng.randint(1, 9999)),
+            'phone': '555-{0:03d}-{1:04d}'.format(rng.randint(0, 999), number % 10000),
+            'genres': make_genres(rng), 'facebook_link': 'https://facebook.com/venue{0}'.format(number),
+            'website': 'https://venue{0}.example.com'.format(number),
+            'seeking_talent': rng.random() < 0.4,
+        })
+    for number in range(artists):
+        city, state = weighted(rng, CITIES)
+        artist_rows.append({
+            'name': make_name(rng, ARTIST_WORDS), 'city': city, 'state': state,
+            'phone': '555-{0:03d}-{1:04d}'.format(rng.randint(0, 999), number % 10000),
+            'genres': make_genres(rng), 'facebook_link': 'https://facebook.com/artist{0}'.format(number),
+            'website': 'https://artist{0}.example.com'.format(number),
+            'seeking_venue': rng.random() < 0.6,
+        })
+    for _ in range(shows):
+        # Most shows cluster around "now", with a long tail into the past
+        # and a shorter one into the future, on evening start times.
+        days = int(rng.triangular(-365, 180, 14))
+        start_time = (now + timedelta(days=days)).replace(
+            hour=rng.choice([18, 19, 20, 21, 22]), minute=rng.choice([0, 30]))
+        show_rows.append({
+            'venue_id': int(rng.paretovariate(1.2)) % venues + 1,
+            'artist_id': rng.randint(1, artists),
+            'start_time': start_time,
+        })
+    return venue_rows, artist_rows, show_rows
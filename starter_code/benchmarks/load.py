@@ -0,0 +1,199 @@
+"""Load test: run the app under gunicorn and step up concurrency.
+
+Replays a weighted mix of browse, search and create requests for a fixed
+time at each concurrency level and reports throughput, latency
+percentiles and error rates:
+
+    FYYUR_ENV=testing python -m benchmarks.load --load --workers 4 \\
+        --concurrency 1,2,4,8,16,32 --mix browse=70,search=25,create=5
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from threading import Thread
+from urllib.parse import urlencode, urlsplit
+
+import app as fyyur
+from app import Artist, Venue, db
+from benchmarks.routes import build_routes, load, percentile
+
+# Route names from benchmarks.routes, grouped into the traffic kinds the
+# mix is given in.
+KINDS = {
+    'browse': ['index', 'venues', 'venue', 'artists', 'artist', 'shows',
+               'genre', 'api venue', 'api artist'],
+    'search': ['venues search', 'artists search', 'suggest'],
+    'create': ['show create', 'venue create', 'artist create'],
+}
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError('unknown traffic kind: ' + kind)
+        mix[kind] = float(weight)
+    return mix
+
+
+def start_server(port, workers, threads, asgi):
+    if asgi:
+        # asgi.py under uvicorn workers; the sync routes use its thread pool.
+        command = ['-k', 'uvicorn.workers.UvicornWorker', 'asgi:application']
+    else:
+        command = ['--threads', str(threads), 'app:create_app()']
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+         '--bind', '127.0.0.1:{0}'.format(port), '--log-level', 'warning'] + command,
+        cwd=PROJECT_DIR)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited with status {0}'.format(server.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start listening on port {0}'.format(port))
+
+
+def client(host, port, routes, mix, deadline, results):
+    # One keep-alive connection per simulated user, reopened after errors.
+    rng = random.Random()
+    kinds, weights = list(mix), list(mix.values())
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        method, path, data = routes[rng.choice(KINDS[kind])]
+        url = path() if callable(path) else path
+        body = urlencode(data(), doseq=True) if data else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, url, body, headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 500
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        results.append((kind, (time.perf_counter() - started) * 1000, ok))
+    connection.close()
+
+
+def run_step(host, port, concurrency, duration, mix, venues, artists):
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = []
+    for _ in range(concurrency):
+        routes = {name: (method, path, data) for name, method, path, data
+                  in build_routes(random.Random(), venues, artists)}
+        thread = Thread(target=client, args=(host, port, routes, mix, deadline, results))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    timings = [elapsed for _, elapsed, _ in results]
+    errors = {kind: 0 for kind in mix}
+    counts = {kind: 0 for kind in mix}
+    for kind, _, ok in results:
+        counts[kind] += 1
+        errors[kind] += not ok
+    return {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'rps': len(results) / duration,
+        'p50': percentile(timings, 0.50) if timings else None,
+        'p95': percentile(timings, 0.95) if timings else None,
+        'p99': percentile(timings, 0.99) if timings else None,
+        'error_rate': sum(errors.values()) / max(len(results), 1),
+        'errors_by_kind': {kind: errors[kind] / max(counts[kind], 1) for kind in mix},
+    }
+
+
+def report(steps):
+    print('{0:>11} {1:>9} {2:>9} {3:>9} {4:>9} {5:>9} {6:>8}'.format(
+        'concurrency', 'requests', 'rps', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for step in steps:
+        print('{0:>11} {1:>9} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>8.2%}'.format(
+            step['concurrency'], step['requests'], step['rps'], step['p50'] or 0,
+            step['p95'] or 0, step['p99'] or 0, step['error_rate']))
+    # Past the saturation point more concurrency only adds queueing: the
+    # throughput stops growing while the tail latency keeps climbing. Report
+    # the first level that reached 90% of the peak throughput.
+    peak = max(step['rps'] for step in steps)
+    saturated = next(step for step in steps if step['rps'] >= 0.9 * peak)
+    print('saturated at {0} concurrent clients: {1:.1f} rps (peak {2:.1f}), p99 {3:.1f} ms'.format(
+        saturated['concurrency'], saturated['rps'], peak, saturated['p99'] or 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Load an already running server instead '
+                        'of starting gunicorn.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1,
+                        help='gunicorn threads per worker.')
+    parser.add_argument('--asgi', action='store_true',
+                        help='Serve asgi.py with uvicorn workers instead of the WSGI app.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32',
+                        help='Comma separated numbers of concurrent clients.')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds to run at each concurrency level.')
+    parser.add_argument('--mix', type=parse_mix, default='browse=70,search=25,create=5')
+    parser.add_argument('--load', action='store_true',
+                        help='Replace the database contents with generated data.')
+    parser.add_argument('--venues', type=int, default=100)
+    parser.add_argument('--artists', type=int, default=300)
+    parser.add_argument('--shows', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    app = fyyur.create_app()
+    with app.app_context():
+        if args.load:
+            if not app.config['TESTING']:
+                parser.error('--load truncates the database; set FYYUR_ENV=testing')
+            load(app, args.venues, args.artists, args.shows, args.seed)
+        venues = db.session.query(db.func.max(Venue.id)).scalar() or 1
+        artists = db.session.query(db.func.max(Artist.id)).scalar() or 1
+        db.session.remove()
+        db.engine.dispose()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        server = start_server(port, args.workers, args.threads, args.asgi)
+    steps = []
+    try:
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            steps.append(run_step(host, port, concurrency, args.duration,
+                                  args.mix, venues, artists))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report(steps)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'steps': steps}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
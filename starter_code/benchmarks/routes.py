@@ -0,0 +1,228 @@
+"""Route benchmarks: load generated data and time every route.
+
+Run from the project directory against a scratch database:
+
+    FYYUR_ENV=testing python -m benchmarks.routes --load --output bench.json
+    FYYUR_ENV=testing python -m benchmarks.routes --baseline bench.json
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from benchmarks.datagen import GENRES, generate
+
+import app as fyyur
+from app import Artist, Show, ShowRollover, Venue, db
+
+# Endpoints that are not benchmarked. delete_venue and the two edit
+# submissions are still stubs that write nothing; the image proxy fetches
+# from the image hosts.
+SKIPPED = {'static', 'main.delete_venue', 'main.edit_venue_submission',
+           'main.edit_artist_submission', 'main.image_proxy'}
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def load(app, venues, artists, shows, seed, now=None):
+    # Whole days keep the generated data the same for a day's runs.
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    venue_rows, artist_rows, show_rows = generate(venues, artists, shows, seed, now)
+    db.session.execute(db.text('TRUNCATE show, venue, artist RESTART IDENTITY CASCADE'))
+    db.session.execute(db.insert(Venue), venue_rows)
+    db.session.execute(db.insert(Artist), artist_rows)
+    db.session.execute(db.insert(Show), show_rows)
+    # The counters start from zero after the truncate; count every show
+    # against a rollover taken now, as `flask rollover-shows` would.
+    db.session.query(ShowRollover).update({'last_run': now})
+    fyyur.count_shows([(row['venue_id'], row['artist_id'], row['start_time'])
+                       for row in show_rows])
+    db.session.commit()
+    if app.config['SHOW_SUMMARY_VIEWS']:
+        fyyur.refresh_show_summaries(app)
+    fyyur.reset_caches()
+
+
+def build_routes(rng, venues, artists):
+    # (name, method, path or callable returning a path, form data). Reads come
+    # first; the write routes at the end add rows as they are measured.
+    venue_id = lambda: '/venues/{0}'.format(rng.randint(1, venues))
+    artist_id = lambda: '/artists/{0}'.format(rng.randint(1, artists))
+    genre = lambda: '/genres/{0}'.format(quote(rng.choice(sorted(fyyur.genre_names()))))
+    term = lambda: rng.choice(['ka', 'lo', 'hall', 'band', 'ven', 'zen'])
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('venues letter', 'GET', lambda: '/venues?letter=' + rng.choice('CINTW'), None),
+        ('venue', 'GET', venue_id, None),
+        ('venue edit form', 'GET', lambda: venue_id() + '/edit', None),
+        ('venue create form', 'GET', '/venues/create', None),
+        ('venues search', 'POST', '/venues/search', lambda: {'search_term': term()}),
+        ('artists', 'GET', '/artists', None),
+        ('artists after', 'GET', lambda: '/artists?after=' + fyyur.encode_cursor(
+            rng.choice('DHLMQT'), 0), None),
+        ('artist', 'GET', artist_id, None),
+        ('artist edit form', 'GET', lambda: artist_id() + '/edit', None),
+        ('artist create form', 'GET', '/artists/create', None),
+        ('artists search', 'POST', '/artists/search', lambda: {'search_term': term()}),
+        ('suggest', 'GET', lambda: '/search/suggest?kind={0}&q={1}'.format(
+            rng.choice(['artist', 'venue']), term()), None),
+        ('genre', 'GET', genre, None),
+        ('shows', 'GET', '/shows', None),
+        ('show create form', 'GET', '/shows/create', None),
+        ('api venues', 'GET', '/api/v1/venues', None),
+        ('api venue', 'GET', lambda: '/api/v1' + venue_id(), None),
+        ('api artists', 'GET', '/api/v1/artists', None),
+        ('api artist', 'GET', lambda: '/api/v1' + artist_id(), None),
+        ('api shows', 'GET', '/api/v1/shows', None),
+        ('export shows', 'GET', '/export/shows.csv', None),
+        ('export venues', 'GET', '/export/venues.ndjson', None),
+        ('export artists', 'GET', '/export/artists.csv', None),
+        ('cache stats', 'GET', '/cache/stats', None),
+        ('pool stats', 'GET', '/pool/stats', None),
+        ('venue create', 'POST', '/venues/create', lambda: {
+            'name': 'Bench Hall', 'city': 'Austin', 'state': 'TX',
+            'address': '1 Main Street', 'phone': '555-000-0000',
+            'genres': rng.choice(GENRES), 'facebook_link': '', 'image_link': '',
+            'website': '', 'seeking_talent': 'no'}),
+        ('artist create', 'POST', '/artists/create', lambda: {
+            'name': 'Bench Band', 'city': 'Austin', 'state': 'TX',
+            'phone': '555-000-0000', 'genres': rng.choice(GENRES),
+            'facebook_link': '', 'image_link': '', 'website': '',
+            'seeking_venue': 'no', 'seeking_description': ''}),
+        ('show create', 'POST', '/shows/create', lambda: {
+            'venue_id': str(rng.randint(1, venues)),
+            'artist_id': str(rng.randint(1, artists)),
+            'start_time': '2030-01-01 20:00:00'}),
+    ]
+
+
+def uncovered(app, routes):
+    # Endpoints with no benchmark route, so new routes are not forgotten.
+    adapter = app.url_map.bind('localhost')
+    covered = set()
+    for _, method, path, _ in routes:
+        path = path() if callable(path) else path
+        covered.add(adapter.match(path.split('?')[0], method=method)[0])
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    return sorted(endpoints - covered - SKIPPED)
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a non-empty list.
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(app, routes, iterations, cold):
+    client = app.test_client()
+    results = {}
+    for name, method, path, data in routes:
+        timings, queries, statuses = [], [], set()
+        # One unmeasured request warms the connection pool and templates.
+        for iteration in range(iterations + 1):
+            if cold:
+                fyyur.reset_caches()
+            url = path() if callable(path) else path
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data() if data else None)
+            response.get_data()
+            # Closing ends streamed responses, releasing their connection.
+            response.close()
+            elapsed = time.perf_counter() - started
+            if not iteration:
+                continue
+            timings.append(elapsed * 1000)
+            statuses.add(response.status_code)
+            # Streamed responses send their headers first, so only queries
+            # run before the stream starts are counted.
+            match = SERVER_TIMING_QUERIES.search(
+                ', '.join(response.headers.getlist('Server-Timing')))
+            queries.append(int(match.group(1)) if match else 0)
+        results[name] = {
+            'p50': percentile(timings, 0.50),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'mean': sum(timings) / len(timings),
+            'queries': max(queries),
+            'statuses': sorted(statuses),
+        }
+    return results
+
+
+def report(results, baseline, threshold):
+    # Prints one line per route; against a baseline, flags routes whose p50
+    # grew by more than `threshold` (and 1ms) or which run more queries.
+    regressions = []
+    print('{0:<20} {1:>9} {2:>9} {3:>9} {4:>8}  {5}'.format(
+        'route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'status'))
+    for name, result in results.items():
+        line = '{0:<20} {1:>9.2f} {2:>9.2f} {3:>9.2f} {4:>8}  {5}'.format(
+            name, result['p50'], result['p95'], result['p99'], result['queries'],
+            ','.join(map(str, result['statuses'])))
+        before = baseline.get(name)
+        if before:
+            change = (result['p50'] - before['p50']) / before['p50']
+            # Sub-millisecond differences are jitter, whatever the ratio.
+            slower = change > threshold and result['p50'] - before['p50'] > 1.0
+            line += '  p50 {0:+.0%}'.format(change)
+            if result['queries'] != before['queries']:
+                line += '  queries {0} -> {1}'.format(before['queries'], result['queries'])
+            if slower or result['queries'] > before['queries']:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--load', action='store_true',
+                        help='Replace the database contents with generated data.')
+    parser.add_argument('--venues', type=int, default=100)
+    parser.add_argument('--artists', type=int, default=300)
+    parser.add_argument('--shows', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--cold', action='store_true',
+                        help='Clear the in-process caches before every request.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='Compare against a saved --output file.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='p50 slowdown that counts as a regression (default 0.2).')
+    args = parser.parse_args(argv)
+
+    # One JSON log line per request would swamp the log; keep N+1 warnings.
+    logging.getLogger('fyyur.sql').setLevel(logging.WARNING)
+    app = fyyur.create_app()
+    with app.app_context():
+        if args.load:
+            if not app.config['TESTING']:
+                parser.error('--load truncates the database; set FYYUR_ENV=testing')
+            load(app, args.venues, args.artists, args.shows, args.seed)
+        venues = db.session.query(db.func.max(Venue.id)).scalar() or 1
+        artists = db.session.query(db.func.max(Artist.id)).scalar() or 1
+        db.session.remove()
+    routes = build_routes(random.Random(args.seed), venues, artists)
+    for endpoint in uncovered(app, routes):
+        print('warning: no benchmark for endpoint ' + endpoint, file=sys.stderr)
+
+    results = run(app, routes, args.iterations, args.cold)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['routes']
+    regressions = report(results, baseline, args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'routes': results}, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Startup benchmark: time a cold import, create_app() and the first request.
+
+Each run is a fresh interpreter, as for a new worker or CLI invocation:
+
+    python -m benchmarks.startup --runs 20 --importtime
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from statistics import median
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child interpreter; prints the three timings in ms as JSON.
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get({path!r}).close()
+served = time.perf_counter()
+print(json.dumps({{'import': (imported - started) * 1000,
+                  'create_app': (created - imported) * 1000,
+                  'first_request': (served - created) * 1000}}))
+'''
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def probe(path):
+    output = subprocess.run([sys.executable, '-c', PROBE.format(path=path)],
+                            cwd=PROJECT_DIR, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def slowest_imports(count):
+    # The direct imports of app.py by cumulative time, grouped by top-level
+    # package, from `python -X importtime` (nesting is two spaces per level).
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=PROJECT_DIR, capture_output=True, text=True,
+                            check=True).stderr
+    totals = {}
+    for match in IMPORTTIME.finditer(stderr):
+        depth, name = len(match.group(3)), match.group(4)
+        # Children are listed before their parent, so the interpreter's own
+        # startup imports are dropped when their top-level parent shows up.
+        if depth == 1 and name == 'app':
+            break
+        if depth == 1:
+            totals = {}
+        elif depth == 3:
+            package = name.split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(2))
+    return sorted(totals.items(), key=lambda item: -item[1])[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/',
+                        help='Path of the first request (default /).')
+    parser.add_argument('--importtime', action='store_true',
+                        help='Also list the slowest imports of app.py.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    # The first run also writes the bytecode caches; it is not measured.
+    probe(args.path)
+    runs = [probe(args.path) for _ in range(args.runs)]
+    results = {phase: median(run[phase] for run in runs) for phase in runs[0]}
+    results['total'] = median(sum(run.values()) for run in runs)
+    for phase, elapsed in results.items():
+        print('{0:<14} {1:>8.1f} ms'.format(phase, elapsed))
+    if args.importtime:
+        print()
+        for package, microseconds in slowest_imports(15):
+            print('{0:<24} {1:>8.1f} ms'.format(package, microseconds / 1000))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'median_ms': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
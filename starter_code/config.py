@@ -1,13 +1,155 @@
 import os
-SECRET_KEY = os.urandom(32)
+from sqlalchemy.pool import NullPool
+from pooling import TimedQueuePool
+
+# Configuration profile: development, testing or production.
+FYYUR_ENV = os.environ.get('FYYUR_ENV', 'development')
+PRODUCTION = FYYUR_ENV == 'production'
+
+# A fixed key is needed so every worker accepts the same session cookies.
+SECRET_KEY = os.environ.get('FYYUR_SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise RuntimeError('FYYUR_SECRET_KEY must be set in production')
+    SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
-DEBUG = True
+DEBUG = FYYUR_ENV == 'development'
+TESTING = FYYUR_ENV == 'testing'
 
 # Connect to the database
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://ahmedghonem@localhost:5432/fyyur')
+if TESTING:
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'TEST_DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per worker process and database. Size it so that
+# workers * (pool size + overflow) stays below the server's max_connections;
+# /pool/stats reports checkout wait times to tune against. In ASGI mode the
+# same budget is split between the sync threads and the async pool below.
+DB_POOL_SIZE = int(os.environ.get('FYYUR_DB_POOL_SIZE', 10 if PRODUCTION else 5))
+DB_MAX_OVERFLOW = int(os.environ.get('FYYUR_DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = int(os.environ.get('FYYUR_DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.environ.get('FYYUR_DB_POOL_RECYCLE', 1800))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get(
+    'FYYUR_DB_STATEMENT_TIMEOUT_MS', 5000 if PRODUCTION else 30000))
+
+# Behind PgBouncer in transaction mode, PgBouncer does the pooling and
+# rejects startup options, so the app opens a connection per checkout and
+# statement_timeout has to be set on the database role instead.
+DB_PGBOUNCER = os.environ.get('FYYUR_DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+
+if DB_PGBOUNCER:
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': NullPool}
+else:
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': TimedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+        'connect_args': {
+            'options': '-c statement_timeout={0}'.format(DB_STATEMENT_TIMEOUT_MS),
+        },
+    }
+
+# /pool/stats and /cache/stats expose database topology and load, so they
+# are off in production unless enabled explicitly (behind an internal-only
+# route, say).
+STATS_ENDPOINTS = os.environ.get(
+    'FYYUR_STATS_ENDPOINTS', '' if PRODUCTION else '1').lower() in ('1', 'true', 'yes')
+
+# ASGI mode (asgi.py): threads running the sync WSGI routes in each worker.
+# Each holds at most one connection of the sync pool while it runs, so the
+# sync pool never opens more than this many. The async routes get the rest
+# of DB_POOL_SIZE plus the overflow, keeping the two within the budget.
+ASGI_SYNC_THREADS = int(os.environ.get('FYYUR_ASGI_SYNC_THREADS', max(DB_POOL_SIZE // 2, 1)))
+ASYNC_DB_POOL_SIZE = max(DB_POOL_SIZE - ASGI_SYNC_THREADS, 1)
+ASYNC_DB_MAX_OVERFLOW = DB_MAX_OVERFLOW
+
+# Seconds the first /venues page may be served from memory. Writes and
+# `flask rollover-shows` invalidate it; this only bounds how long a missed
+# invalidation can last.
+VENUE_AREAS_CACHE_TTL = 60
+
+# Number of show tiles rendered per /shows page.
+SHOWS_PER_PAGE = 30
+
+# Page sizes for the keyset-paginated /artists and /venues directories.
+ARTISTS_PER_PAGE = 50
+VENUES_PER_PAGE = 50
+
+# Maximum number of ranked results returned by the search endpoints.
+SEARCH_RESULTS_LIMIT = 25
+
+# Upper bound on names held by each in-memory typeahead index, and on the
+# number of suggestions returned per query.
+TYPEAHEAD_MAX_ENTRIES = 200000
+TYPEAHEAD_MAX_RESULTS = 20
+
+# Rendered venue/artist detail page cache: LRU capacity and per-entry TTL
+# in seconds.
+PAGE_CACHE_MAX_ENTRIES = 2000
+PAGE_CACHE_TTL = 300
+
+# Postgres NOTIFY channel used to invalidate per-worker caches after writes,
+# and whether each worker starts a listener thread for it.
+INVALIDATION_CHANNEL = 'fyyur_invalidation'
+INVALIDATION_LISTENER = not TESTING
+# LISTEN needs a session-level connection, so it bypasses PgBouncer.
+INVALIDATION_DATABASE_URI = os.environ.get(
+    'FYYUR_DIRECT_DATABASE_URL', SQLALCHEMY_DATABASE_URI)
+
+# Artists and venues listed per page on /genres/<genre>.
+GENRE_RESULTS_PER_PAGE = 50
+
+# Rows fetched per round trip from the server-side cursor during exports.
+EXPORT_BATCH_SIZE = 1000
+
+# Read replicas, as a comma separated list of database URIs. Read-only
+# handlers pick one per request; writes always go to the primary, and a user
+# who just wrote stays on the primary for READ_YOUR_WRITES_SECONDS.
+SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.environ.get(
+    'FYYUR_REPLICA_URIS', '').split(',') if uri.strip()]
+SQLALCHEMY_BINDS = {'replica_{0}'.format(number): uri
+                    for number, uri in enumerate(SQLALCHEMY_REPLICA_URIS)}
+READ_YOUR_WRITES_SECONDS = 5
+
+# Serve the venue/artist detail show lists from the show summary
+# materialized views, refreshed by `flask refresh-show-summaries` and,
+# optionally, in the background after every show-affecting write.
+SHOW_SUMMARY_VIEWS = os.environ.get('FYYUR_SHOW_SUMMARY_VIEWS', '').lower() in ('1', 'true', 'yes')
+SHOW_SUMMARY_REFRESH_AFTER_WRITES = True
+# A full rebuild outlasts DB_STATEMENT_TIMEOUT_MS on any real data set, so
+# the refresh transaction sets its own; 0 disables the timeout.
+SHOW_SUMMARY_REFRESH_TIMEOUT_MS = int(os.environ.get('FYYUR_SHOW_SUMMARY_REFRESH_TIMEOUT_MS', 0))
+
+# `flask build-assets` writes content-hashed, minified and precompressed
+# copies of static/ and this manifest, relative to the static folder. Once it
+# exists, url_for('static') resolves to the hashed names, which are served
+# with a far-future immutable Cache-Control. Rebuild after changing static/.
+STATIC_MANIFEST = 'dist/manifest.json'
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
+# Image proxy (/images/<width>): venue and artist image_link URLs are fetched
+# once, resized to one of IMAGE_PROXY_WIDTHS and kept in an on-disk LRU cache
+# shared by the workers. Hosts with private or loopback addresses are refused
+# except in testing, which uses a local stub server.
+IMAGE_PROXY_WIDTHS = (400, 800)
+IMAGE_PROXY_TIMEOUT = 5
+IMAGE_PROXY_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+IMAGE_PROXY_ALLOW_PRIVATE_HOSTS = TESTING
+IMAGE_PROXY_MAX_AGE = 30 * 24 * 3600
+IMAGE_CACHE_DIR = os.environ.get('FYYUR_IMAGE_CACHE_DIR', os.path.join(basedir, 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('FYYUR_IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://ahmedghonem@localhost:5432/fyyur'
+# Per-request query counts and DB time, reported in Server-Timing headers and
+# as one log line per request; a statement repeated more than
+# N_PLUS_ONE_THRESHOLD times in one request is logged as a likely N+1.
+SQL_INSTRUMENTATION = True
+N_PLUS_ONE_THRESHOLD = 10
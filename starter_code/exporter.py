@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def to_value(value, format):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and format == 'csv':
+        # Same comma separated genres cell the importer reads.
+        return ','.join(value)
+    return value
+
+
+def serialize_rows(rows, columns, format):
+    # Yield one encoded line per row so the response never holds more than
+    # the current row in memory.
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([to_value(getattr(row, column), format)
+                             for column in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps({column: to_value(getattr(row, column), format)
+                              for column in columns}) + '\n'
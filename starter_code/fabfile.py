@@ -56,3 +56,13 @@ def deploy():
 
 def rollback():
     local("heroku rollback")
+
+# benchmarks
+
+
+def bench(baseline=None):
+    # Time every route against generated data in the test database.
+    command = "FYYUR_ENV=testing python -m benchmarks.routes --load --output bench.json"
+    if baseline:
+        command += " --baseline {}".format(baseline)
+    local(command)
@@ -0,0 +1,50 @@
+from datetime import datetime
+from functools import lru_cache
+
+# Named formats accepted by format_datetime; anything else is treated as a
+# raw babel pattern.
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# babel and dateutil are imported on first use, keeping them out of app
+# startup.
+
+
+@lru_cache(maxsize=1)
+def default_locale():
+    import babel.dates
+    return babel.dates.LC_TIME or 'en_US_POSIX'
+
+
+@lru_cache(maxsize=64)
+def compile_pattern(format):
+    import babel.dates
+    return babel.dates.parse_pattern(PATTERNS.get(format, format))
+
+
+@lru_cache(maxsize=64)
+def load_locale(locale):
+    import babel
+    return babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=8192)
+def format_cached(value, format, locale):
+    return compile_pattern(format).apply(value, load_locale(locale))
+
+
+def format_datetime(value, format='medium', locale=None):
+    # Accepts datetime objects directly; strings are still parsed for
+    # backwards compatibility but are the slow path.
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return format_cached(value, format, locale or default_locale())
+
+
+def format_datetimes(values, format='medium', locale=None):
+    # Batch form of format_datetime for a whole show list.
+    locale = locale or default_locale()
+    return [format_datetime(value, format, locale) for value in values]
@@ -0,0 +1,87 @@
+import csv
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from forms import ArtistForm, ShowForm, VenueForm
+
+FORMS = {'artist': ArtistForm, 'venue': VenueForm, 'show': ShowForm}
+
+# Accepted spellings of the seeking_* flags: the create forms' yes/no, and the
+# true/false written by the exporter (JSON booleans arrive as 'True'/'False').
+BOOLEANS = {'yes': True, 'true': True, 'no': False, 'false': False}
+
+
+def read_rows(stream, format):
+    # Stream dicts out of CSV (genres as a comma separated cell) or NDJSON
+    # without loading the whole file.
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            if row.get('genres') is not None:
+                row['genres'] = [genre.strip()
+                                 for genre in row['genres'].split(',') if genre.strip()]
+            yield row
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def to_formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif value is not None:
+            formdata[key] = str(value)
+    return formdata
+
+
+def validate_row(kind, row):
+    # Apply the same validators as the create forms; returns (values, errors).
+    if kind == 'show':
+        if not row.get('start_time'):
+            # ShowForm would silently fall back to its default of "today".
+            return None, {'start_time': ['This field is required.']}
+        # The exporter writes ISO 8601; ShowForm only parses its own format.
+        try:
+            start_time = datetime.fromisoformat(str(row['start_time']).strip())
+        except ValueError:
+            return None, {'start_time': ['invalid datetime, expected ISO 8601']}
+        if start_time.tzinfo is not None:
+            start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+        row = dict(row, start_time=start_time.strftime('%Y-%m-%d %H:%M:%S'))
+    form = FORMS[kind](formdata=to_formdata(row), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    values = dict(form.data)
+    if kind == 'show':
+        try:
+            values['artist_id'] = int(values['artist_id'])
+            values['venue_id'] = int(values['venue_id'])
+        except (TypeError, ValueError):
+            return None, {'artist_id/venue_id': ['must be integers']}
+        if not isinstance(values['start_time'], datetime):
+            return None, {'start_time': ['invalid datetime']}
+    else:
+        seeking = 'seeking_talent' if kind == 'venue' else 'seeking_venue'
+        flag = BOOLEANS.get(values[seeking].strip().lower())
+        if flag is None:
+            return None, {seeking: ['must be yes/no or true/false']}
+        values[seeking] = flag
+        if kind == 'venue':
+            # VenueForm has no seeking_description field; carry it through.
+            values['seeking_description'] = row.get('seeking_description') or None
+    values.pop('csrf_token', None)
+    return values, None
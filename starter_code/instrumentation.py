@@ -0,0 +1,86 @@
+import json
+import logging
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fyyur.sql')
+
+
+# The start time lives on the execution context, which ends with the
+# statement, so a statement that fails leaves nothing behind on the pooled
+# connection.
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record(statement, context)
+
+
+def handle_error(exception_context):
+    # Failed statements (timeouts, constraint violations) count too;
+    # after_cursor_execute never sees them.
+    if exception_context.execution_context is not None:
+        record(exception_context.statement, exception_context.execution_context, error=True)
+
+
+def record(statement, context, error=False):
+    started = getattr(context, 'query_started', None)
+    if started is None or not has_request_context() or 'sql_stats' not in g:
+        return
+    stats = g.sql_stats
+    stats['queries'] += 1
+    stats['errors'] += error
+    stats['duration'] += time.perf_counter() - started
+    # Parameters are bound separately, so identical text means the same
+    # statement shape, e.g. one lookup per row of an N+1 loop.
+    stats['shapes'][statement] += 1
+
+
+def start_request():
+    g.sql_stats = {'queries': 0, 'errors': 0, 'duration': 0.0, 'shapes': Counter()}
+    g.request_started = time.perf_counter()
+
+
+def finish_request(response, threshold):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    total = time.perf_counter() - g.request_started
+    response.headers.add('Server-Timing', 'db;dur={0:.1f};desc="{1} queries"'.format(
+        stats['duration'] * 1000, stats['queries']))
+    response.headers.add('Server-Timing', 'total;dur={0:.1f}'.format(total * 1000))
+
+    repeated = [(statement, count) for statement, count in stats['shapes'].items()
+                if count > threshold]
+    logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'queries': stats['queries'],
+        'query_errors': stats['errors'],
+        'db_ms': round(stats['duration'] * 1000, 2),
+        'total_ms': round(total * 1000, 2),
+        'repeated_statements': len(repeated),
+    }))
+    for statement, count in repeated:
+        logger.warning('possible N+1 in %s: statement ran %d times: %s',
+                       request.endpoint, count, ' '.join(statement.split())[:300])
+    return response
+
+
+def init_app(app):
+    # Engine-class listeners cover the primary and every replica bind. They
+    # are process-wide, so an app created after the first adds none.
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+    app.before_request(start_request)
+    app.after_request(lambda response: finish_request(
+        response, app.config['N_PLUS_ONE_THRESHOLD']))
@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import select
+import time
+from threading import Lock, Thread
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def notify(session, channel, change):
+    # Queue a change notification on the session's transaction. Postgres only
+    # delivers it to listeners if that transaction commits.
+    session.execute(text('SELECT pg_notify(:channel, :payload)'),
+                    {'channel': channel, 'payload': json.dumps(change)})
+
+
+class InvalidationListener(object):
+    # One daemon thread per worker process that LISTENs on `channel` and hands
+    # every decoded change to `on_change`. After a (re)connect `on_reset` is
+    # called, since notifications sent while disconnected are lost.
+
+    def __init__(self, connect, channel, on_change, on_reset, poll_interval=5):
+        self.connect = connect
+        self.channel = channel
+        self.on_change = on_change
+        self.on_reset = on_reset
+        self.poll_interval = poll_interval
+        self.pid = None
+        self.lock = Lock()
+
+    def ensure_started(self):
+        # Threads do not survive fork, so start lazily in each worker.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            thread = Thread(target=self.run, name='invalidation-listener')
+            thread.daemon = True
+            thread.start()
+            self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception('invalidation listener disconnected')
+                time.sleep(self.poll_interval)
+
+    def listen(self):
+        connection = self.connect()
+        try:
+            connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute('LISTEN "{0}"'.format(self.channel))
+            self.on_reset()
+            while True:
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    try:
+                        self.on_change(json.loads(notification.payload))
+                    except ValueError:
+                        logger.warning('ignoring malformed invalidation %r',
+                                       notification.payload)
+        finally:
+            connection.close()
@@ -0,0 +1,47 @@
+"""show summary materialized views
+
+Revision ID: 0e6b7a3c5d92
+Revises: f1c4d9e2a7b3
+Create Date: 2026-10-18 15:48:09.127730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e6b7a3c5d92'
+down_revision = 'f1c4d9e2a7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE MATERIALIZED VIEW venue_show_summary AS
+        SELECT show.id AS show_id, show.venue_id, show.start_time,
+               artist.id AS artist_id, artist.name AS artist_name,
+               artist.image_link AS artist_image_link
+        FROM show JOIN artist ON artist.id = show.artist_id
+    """)
+    op.execute("""
+        CREATE MATERIALIZED VIEW artist_show_summary AS
+        SELECT show.id AS show_id, show.artist_id, show.start_time,
+               venue.id AS venue_id, venue.name AS venue_name,
+               venue.image_link AS venue_image_link
+        FROM show JOIN venue ON venue.id = show.venue_id
+    """)
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index.
+    op.create_index('ix_venue_show_summary_show_id', 'venue_show_summary',
+                    ['show_id'], unique=True)
+    op.create_index('ix_venue_show_summary_venue_id_start_time', 'venue_show_summary',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_artist_show_summary_show_id', 'artist_show_summary',
+                    ['show_id'], unique=True)
+    op.create_index('ix_artist_show_summary_artist_id_start_time', 'artist_show_summary',
+                    ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW artist_show_summary')
+    op.execute('DROP MATERIALIZED VIEW venue_show_summary')
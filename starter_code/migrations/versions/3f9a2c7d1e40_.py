@@ -0,0 +1,28 @@
+"""directory listing indexes
+
+Revision ID: 3f9a2c7d1e40
+Revises: 6174b5ea5124
+Create Date: 2026-10-18 10:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c7d1e40'
+down_revision = '6174b5ea5124'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination of /artists and /venues walks these indexes in order.
+    op.create_index('ix_artist_name_id', 'artist', ['name', 'id'], unique=False)
+    op.create_index('ix_venue_area_name', 'venue',
+                    ['state', 'city', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_area_name', table_name='venue')
+    op.drop_index('ix_artist_name_id', table_name='artist')
@@ -0,0 +1,33 @@
+"""trigram search indexes
+
+Revision ID: 8b41e6d05a93
+Revises: 3f9a2c7d1e40
+Create Date: 2026-10-18 11:02:47.551830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6d05a93'
+down_revision = '3f9a2c7d1e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm GIN indexes serve both ILIKE '%term%' and the fuzzy % operator
+    # used by search_venues / search_artists.
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
@@ -0,0 +1,42 @@
+"""update stamps for conditional GET
+
+Revision ID: a5e83f2b7c61
+Revises: d72c5a1f9b08
+Create Date: 2026-10-18 13:41:52.906274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5e83f2b7c61'
+down_revision = 'd72c5a1f9b08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Naive UTC, like datetime.utcnow() in the app; now() alone would be in
+    # the session's time zone and put existing rows ahead of later writes.
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+    with op.get_context().autocommit_block():
+        for table in ('venue', 'artist', 'show'):
+            op.create_index('ix_{0}_updated_at'.format(table), table,
+                            ['updated_at'], unique=False, postgresql_concurrently=True)
+        # Keyset pagination of /shows and the latest-past-show lookup.
+        op.create_index('ix_show_start_time_id', 'show',
+                        ['start_time', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_show_start_time_id', table_name='show',
+                      postgresql_concurrently=True)
+        for table in ('show', 'artist', 'venue'):
+            op.drop_index('ix_{0}_updated_at'.format(table), table_name=table,
+                          postgresql_concurrently=True)
+    for table in ('show', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,33 @@
+"""venue listing columns not null
+
+Revision ID: b7e2d4f8c913
+Revises: 0e6b7a3c5d92
+Create Date: 2026-10-18 19:02:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4f8c913'
+down_revision = '0e6b7a3c5d92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination compares (state, city, name, id) as a row, which is
+    # never true once a NULL is involved. The forms require all three.
+    op.execute("""
+        UPDATE venue SET state = coalesce(state, ''), city = coalesce(city, ''),
+                         name = coalesce(name, '')
+        WHERE state IS NULL OR city IS NULL OR name IS NULL
+    """)
+    for column in ('name', 'city', 'state'):
+        op.alter_column('venue', column, existing_type=sa.String(), nullable=False)
+
+
+def downgrade():
+    for column in ('state', 'city', 'name'):
+        op.alter_column('venue', column, existing_type=sa.String(), nullable=True)
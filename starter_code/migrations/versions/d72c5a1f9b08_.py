@@ -0,0 +1,44 @@
+"""show and genre indexes
+
+Revision ID: d72c5a1f9b08
+Revises: 8b41e6d05a93
+Create Date: 2026-10-18 12:20:05.318467
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd72c5a1f9b08'
+down_revision = '8b41e6d05a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, so these run
+    # in an autocommit block and do not lock show/artist/venue against writes.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_venue_id_start_time', 'show',
+                        ['venue_id', 'start_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_show_artist_id_start_time', 'show',
+                        ['artist_id', 'start_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_venue_genres', table_name='venue',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_artist_genres', table_name='artist',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_show_artist_id_start_time', table_name='show',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_show_venue_id_start_time', table_name='show',
+                      postgresql_concurrently=True)
@@ -0,0 +1,52 @@
+"""denormalized show counters
+
+Revision ID: f1c4d9e2a7b3
+Revises: a5e83f2b7c61
+Create Date: 2026-10-18 14:55:18.640211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c4d9e2a7b3'
+down_revision = 'a5e83f2b7c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+    op.create_table('show_rollover',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('last_run', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    # start_time is stored as naive UTC, like datetime.utcnow() in the app.
+    op.execute("INSERT INTO show_rollover (id, last_run) VALUES (1, timezone('utc', now()))")
+    for table, column in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute("""
+            UPDATE {0} SET
+                upcoming_shows_count = counts.upcoming,
+                past_shows_count = counts.past
+            FROM (
+                SELECT {1} AS id,
+                       count(*) FILTER (WHERE start_time > last_run) AS upcoming,
+                       count(*) FILTER (WHERE start_time <= last_run) AS past
+                FROM show, show_rollover
+                GROUP BY {1}
+            ) AS counts
+            WHERE {0}.id = counts.id
+        """.format(table, column))
+
+
+def downgrade():
+    op.drop_table('show_rollover')
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,48 @@
+import time
+from threading import Lock
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waited for a connection,
+    # so the pool can be sized against the number of worker threads.
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = {'checkouts': 0, 'timeouts': 0,
+                      'wait_total': 0.0, 'wait_max': 0.0}
+        # Every request thread checks out from the same pool.
+        self.stats_lock = Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self.stats_lock:
+                self.stats['checkouts'] += 1
+                self.stats['timeouts'] += timed_out
+                self.stats['wait_total'] += waited
+                self.stats['wait_max'] = max(self.stats['wait_max'], waited)
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                     checked_out=pool.checkedout(), overflow=pool.overflow())
+    timings = getattr(pool, 'stats', None)
+    if timings:
+        with pool.stats_lock:
+            timings = dict(timings)
+        stats.update(timings)
+        stats['wait_avg'] = timings['wait_total'] / max(timings['checkouts'], 1)
+    return stats
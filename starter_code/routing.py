@@ -0,0 +1,57 @@
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, session
+from flask_sqlalchemy.session import Session
+
+
+class RoutingSession(Session):
+    # Sends reads to the replica chosen for the current request (see
+    # `replica_read`) and everything else, including any flush, to the
+    # primary.
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = g.get('replica_bind') if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return self._db.engines[replica]
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def replica_binds():
+    return [key for key in current_app.config.get('SQLALCHEMY_BINDS') or {}
+            if key.startswith('replica')]
+
+
+def pin_to_primary():
+    # Read-your-writes: after a user's own write, their reads stay on the
+    # primary until replicas have had time to catch up.
+    session['primary_until'] = time.time() + \
+        current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+def replica_read(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        binds = replica_binds()
+        if binds and not g.get('primary_reads') and \
+                session.get('primary_until', 0) < time.time():
+            g.replica_bind = random.choice(binds)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    # Shared in-process caches are filled from the primary. A replica that
+    # has not caught up with a write yet would otherwise have its pre-write
+    # data cached for everyone, the writer included, until the entry expires.
+    replica = g.pop('replica_bind', None)
+    g.primary_reads = True
+    try:
+        yield
+    finally:
+        g.primary_reads = False
+        if replica is not None:
+            g.replica_bind = replica
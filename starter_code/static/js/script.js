@@ -2,3 +2,31 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// As-you-type suggestions for the navbar search box, served by /search/suggest.
+document.addEventListener('DOMContentLoaded', function () {
+  var input = document.querySelector('input[data-suggest-kind]');
+  var list = document.getElementById('search-suggestions');
+  if (!input || !list) return;
+  var latest = 0;
+  input.addEventListener('input', function () {
+    var query = input.value.trim();
+    var request = ++latest;
+    if (!query) {
+      list.innerHTML = '';
+      return;
+    }
+    fetch('/search/suggest?kind=' + input.dataset.suggestKind +
+          '&q=' + encodeURIComponent(query))
+      .then(function (response) { return response.json(); })
+      .then(function (suggestions) {
+        if (request !== latest) return;
+        list.innerHTML = '';
+        suggestions.forEach(function (suggestion) {
+          var option = document.createElement('option');
+          option.value = suggestion.name;
+          list.appendChild(option);
+        });
+      });
+  });
+});
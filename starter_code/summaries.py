@@ -0,0 +1,82 @@
+import logging
+from threading import Lock, Thread
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Materialized views created by the show summaries migration, with the
+# column naming the venue or artist each row is shown for. Each has a unique
+# index on show_id, which REFRESH ... CONCURRENTLY requires.
+VIEWS = {'venue_show_summary': 'venue_id', 'artist_show_summary': 'artist_id'}
+
+
+def refresh_summaries(connection, timeout_ms=0, diff=False):
+    # CONCURRENTLY keeps the views readable while they are rebuilt. The
+    # connection's statement_timeout is meant for requests; SET LOCAL
+    # replaces it for this transaction only, so the pooled connection goes
+    # back unchanged.
+    #
+    # With `diff`, returns {view: ids whose rows changed}, from a copy of the
+    # previous contents that is dropped at commit. That costs more than the
+    # refresh itself, so it is only for refreshes that do not know which
+    # writes they are catching up with.
+    connection.execute(text('SET LOCAL statement_timeout = {0:d}'.format(timeout_ms)))
+    changed = {}
+    for view, column in VIEWS.items():
+        if diff:
+            connection.execute(text(
+                'CREATE TEMP TABLE previous_{0} ON COMMIT DROP AS TABLE {0}'.format(view)))
+        connection.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY ' + view))
+        if diff:
+            changed[view] = {id for id, in connection.execute(text(
+                'SELECT DISTINCT {1} FROM ((TABLE {0} EXCEPT TABLE previous_{0}) '
+                'UNION ALL (TABLE previous_{0} EXCEPT TABLE {0})) AS changed'
+                .format(view, column)))}
+    return changed if diff else None
+
+
+class BackgroundRefresher(object):
+    # Runs `refresh(venue_ids, artist_ids)` on a daemon thread, with the ids
+    # queued by the writes it catches up with. Requests that arrive while a
+    # refresh is running are coalesced into one follow-up refresh, so a
+    # burst of writes costs at most two rebuilds.
+
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self.lock = Lock()
+        self.running = False
+        self.pending = False
+        self.venue_ids = set()
+        self.artist_ids = set()
+
+    def request(self, venue_ids=(), artist_ids=()):
+        with self.lock:
+            self.venue_ids.update(venue_ids)
+            self.artist_ids.update(artist_ids)
+            if self.running:
+                self.pending = True
+                return
+            self.running = True
+        thread = Thread(target=self.run, name='summary-refresher')
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while True:
+            with self.lock:
+                venue_ids, self.venue_ids = self.venue_ids, set()
+                artist_ids, self.artist_ids = self.artist_ids, set()
+            try:
+                self.refresh(venue_ids, artist_ids)
+            except Exception:
+                logger.exception('show summary refresh failed')
+                # Kept for the next refresh, which still has to catch up.
+                with self.lock:
+                    self.venue_ids.update(venue_ids)
+                    self.artist_ids.update(artist_ids)
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                self.pending = False
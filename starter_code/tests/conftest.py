@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# The modules live at the project root, next to app.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def form_context():
+    # Flask-WTF forms need a request context; no database is involved.
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    with app.test_request_context():
+        yield app
@@ -0,0 +1,144 @@
+import io
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from app import create_app, thumbnail_url
+from thumbnails import ImageError, ThumbnailCache, fetch_image
+
+
+def jpeg(width, height):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+class Upstream(BaseHTTPRequestHandler):
+    # Serves /photo.jpg and 404s everything else, counting requests per path.
+    images = {'/photo.jpg': jpeg(1200, 800)}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        data = self.images.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    Upstream.requests = []
+    yield 'http://127.0.0.1:{0}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(tmp_path):
+    # The proxy never touches the database, so none is needed.
+    app = create_app()
+    app.config.update(TESTING=True, INVALIDATION_LISTENER=False,
+                      IMAGE_PROXY_ALLOW_PRIVATE_HOSTS=True)
+    app.extensions['thumbnails'] = ThumbnailCache(str(tmp_path), 1024 * 1024)
+    return app
+
+
+def proxy_url(app, url, width=400):
+    with app.test_request_context():
+        return thumbnail_url(url, width)
+
+
+def test_fetch_and_resize(app, upstream):
+    response = app.test_client().get(proxy_url(app, upstream + '/photo.jpg'))
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.cache_control.public
+    assert response.cache_control.max_age == app.config['IMAGE_PROXY_MAX_AGE']
+    assert Image.open(io.BytesIO(response.data)).size == (400, 267)
+
+
+def test_cache_hit(app, upstream):
+    client = app.test_client()
+    url = proxy_url(app, upstream + '/photo.jpg')
+    first = client.get(url)
+    second = client.get(url)
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert Upstream.requests == ['/photo.jpg']
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_bad_signature(app, upstream):
+    url = proxy_url(app, upstream + '/photo.jpg')
+    client = app.test_client()
+    assert client.get(url.replace('signature=', 'signature=0')).status_code == 404
+    assert client.get(proxy_url(app, upstream + '/photo.jpg', width=123)).status_code == 404
+    assert Upstream.requests == []
+
+
+def test_upstream_404_redirects(app, upstream):
+    client = app.test_client()
+    url = proxy_url(app, upstream + '/missing.jpg')
+    response = client.get(url)
+    assert response.status_code == 302
+    assert response.location == upstream + '/missing.jpg'
+    # Failures are not cached, so the next request tries again.
+    client.get(url)
+    assert Upstream.requests == ['/missing.jpg', '/missing.jpg']
+
+
+def test_eviction(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), 2500)
+    for age, key in enumerate(['b', 'a']):
+        cache.set(key, b'x' * 1000)
+        os.utime(tmp_path / key, (1000 + age, 1000 + age))
+    # Past max_bytes the least recently used files go, down to 90% of it.
+    cache.set('c', b'x' * 1000)
+    assert cache.get('b') is None
+    assert cache.get('a') == cache.get('c') == b'x' * 1000
+    assert cache.size == 2000
+
+
+def test_private_addresses_refused(upstream):
+    with pytest.raises(ImageError):
+        fetch_image(upstream + '/photo.jpg', 5, 1024 * 1024)
+    assert Upstream.requests == []
+
+
+def test_connects_to_the_checked_address(upstream, monkeypatch):
+    # A rebinding name answers the check with one address and the connection
+    # with another; the fetch has to resolve it once and dial that address.
+    resolve = socket.getaddrinfo
+    answers = iter(['127.0.0.1', '10.255.255.1'])
+    lookups = []
+
+    def rebinding(host, port, *args, **kwargs):
+        if host == 'images.example':
+            lookups.append(port)
+            host = next(answers)
+        return resolve(host, port, *args, **kwargs)
+    monkeypatch.setattr(socket, 'getaddrinfo', rebinding)
+    port = upstream.rsplit(':', 1)[1]
+    data = fetch_image('http://images.example:{0}/photo.jpg'.format(port), 5, 1024 * 1024,
+                       allow_private=True)
+    assert data == Upstream.images['/photo.jpg']
+    assert lookups == [int(port)]
+    with pytest.raises(ImageError, match='non-public'):
+        fetch_image('https://images.example/photo.jpg', 5, 1024 * 1024)
+    assert lookups[-1] == 443
@@ -0,0 +1,79 @@
+import io
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import EXPORT_COLUMNS
+from exporter import serialize_rows
+from importer import read_rows, validate_row
+
+VENUE = SimpleNamespace(
+    id=1, name='The Musical Hop', city='San Francisco', state='CA',
+    address='1015 Folsom Street', phone='123-123-1234', genres=['Jazz', 'Reggae'],
+    image_link='https://example.com/hop.jpg', facebook_link='https://facebook.com/hop',
+    website='https://hop.example.com', seeking_talent=True,
+    seeking_description='Looking for a local artist')
+ARTIST = SimpleNamespace(
+    id=2, name='Guns N Petals', city='San Francisco', state='CA', phone='326-123-5000',
+    genres=['Rock n Roll'], image_link='https://example.com/gnp.jpg',
+    facebook_link='https://facebook.com/gnp', website='https://gnp.example.com',
+    seeking_venue=False, seeking_description='Not right now')
+SHOW = SimpleNamespace(
+    id=3, start_time=datetime(2030, 1, 1, 20, 0), venue_id=1, venue_name='The Musical Hop',
+    artist_id=2, artist_name='Guns N Petals')
+
+
+def round_trip(kind, row, format):
+    exported = ''.join(serialize_rows([row], EXPORT_COLUMNS[kind + 's'], format))
+    [imported] = read_rows(io.StringIO(exported, newline=''), format)
+    return validate_row(kind, imported)
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_venue_round_trip(form_context, format):
+    values, errors = round_trip('venue', VENUE, format)
+    assert errors is None
+    assert values['seeking_talent'] is True
+    assert values['seeking_description'] == VENUE.seeking_description
+    assert values['genres'] == VENUE.genres
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_artist_round_trip(form_context, format):
+    values, errors = round_trip('artist', ARTIST, format)
+    assert errors is None
+    assert values['seeking_venue'] is False
+    assert values['genres'] == ARTIST.genres
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_show_round_trip(form_context, format):
+    values, errors = round_trip('show', SHOW, format)
+    assert errors is None
+    assert values['start_time'] == SHOW.start_time
+    assert (values['venue_id'], values['artist_id']) == (1, 2)
+
+
+def test_show_start_time_formats(form_context):
+    row = {'venue_id': '1', 'artist_id': '2'}
+    for start_time in ['2030-01-01 20:00:00', '2030-01-01T20:00:00', '2030-01-01T21:00:00+01:00']:
+        values, errors = validate_row('show', dict(row, start_time=start_time))
+        assert errors is None
+        assert values['start_time'] == datetime(2030, 1, 1, 20, 0)
+    values, errors = validate_row('show', dict(row, start_time='next tuesday'))
+    assert errors == {'start_time': ['invalid datetime, expected ISO 8601']}
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('yes', True), ('No', False), ('true', True), ('False', False), (True, True), (False, False)])
+def test_seeking_flags(form_context, value, expected):
+    row = {'name': 'Bench Band', 'city': 'Austin', 'state': 'TX', 'phone': '1',
+           'genres': ['Jazz'], 'facebook_link': 'https://facebook.com/b',
+           'website': 'https://b.example.com', 'seeking_description': 'hi',
+           'seeking_venue': value}
+    values, errors = validate_row('artist', row)
+    assert errors is None
+    assert values['seeking_venue'] is expected
+    assert validate_row('artist', dict(row, seeking_venue='maybe'))[1] == {
+        'seeking_venue': ['must be yes/no or true/false']}
@@ -0,0 +1,186 @@
+import hashlib
+import hmac
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+from threading import Lock
+from urllib.parse import urlsplit
+from urllib.request import (HTTPHandler, HTTPRedirectHandler, HTTPSHandler, ProxyHandler,
+                            Request, build_opener)
+
+
+class ImageError(Exception):
+    pass
+
+
+class ThumbnailCache(object):
+    # Resized images on disk, one file per (source URL, width), with the
+    # total size kept under `max_bytes` by evicting the least recently used
+    # files. Recency is the file mtime, bumped on every hit, so all workers
+    # sharing the directory evict in the same order.
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Bytes on disk as last counted plus this worker's writes since;
+        # None until the first write counts them.
+        self.size = None
+        self.lock = Lock()
+
+    def get(self, key):
+        # Returns the bytes rather than a path, since another worker may
+        # evict the file at any time.
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see a
+        # partial file.
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, os.path.join(self.directory, key))
+        with self.lock:
+            if self.size is not None:
+                self.size += len(data)
+            if self.size is None or self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Other workers write to the same directory, so recount from disk.
+        # Evicting down to 90% keeps every write past the bound from
+        # rescanning.
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        self.size = sum(size for _, size, _ in entries)
+        if self.size <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+
+def thumbnail_key(url, width):
+    return hashlib.sha256('{0} {1}'.format(width, url).encode('utf-8')).hexdigest()
+
+
+def sign(secret, url, width):
+    # Proxy URLs are only valid as rendered by the app, so the endpoint
+    # cannot be used to fetch arbitrary URLs.
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, '{0} {1}'.format(width, url).encode('utf-8'),
+                    hashlib.sha256).hexdigest()[:16]
+
+
+def check_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageError('not an http(s) URL: {0!r}'.format(url))
+
+
+def resolve_host(host, port, allow_private):
+    # image_link is user input; without this the proxy could be pointed at
+    # internal services. Returns the address to connect to, so the host is
+    # not resolved a second time (to a different address) by the connection.
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ImageError('cannot resolve {0}: {1}'.format(host, e))
+    if not allow_private:
+        for address in addresses:
+            if not ipaddress.ip_address(address[4][0].split('%')[0]).is_global:
+                raise ImageError('refusing non-public address for {0}'.format(host))
+    return addresses[0][4][0]
+
+
+def pinned_connection(connection_class, allow_private):
+    # http.client connection factory that dials the vetted address. The
+    # connection keeps the host name, so the Host header, SNI and the
+    # certificate check are unchanged.
+    def connect(host, **kwargs):
+        connection = connection_class(host, **kwargs)
+        address = resolve_host(connection.host, connection.port, allow_private)
+        connection._create_connection = lambda target, *args: \
+            socket.create_connection((address, target[1]), *args)
+        return connection
+    return connect
+
+
+def fetch_image(url, timeout, max_bytes, allow_private=False):
+    # Every hop, redirects included, connects through pinned_connection().
+    # Proxies from the environment are off, since a proxy would resolve the
+    # host itself.
+    class PinnedHTTPHandler(HTTPHandler):
+        def do_open(self, http_class, request, **kwargs):
+            return super().do_open(pinned_connection(http_class, allow_private),
+                                   request, **kwargs)
+
+    class PinnedHTTPSHandler(HTTPSHandler):
+        def do_open(self, http_class, request, **kwargs):
+            return super().do_open(pinned_connection(http_class, allow_private),
+                                   request, **kwargs)
+
+    class CheckedRedirectHandler(HTTPRedirectHandler):
+        def redirect_request(self, request, fp, code, msg, headers, newurl):
+            check_url(newurl)
+            return super().redirect_request(request, fp, code, msg, headers, newurl)
+
+    check_url(url)
+    opener = build_opener(ProxyHandler({}), PinnedHTTPHandler, PinnedHTTPSHandler,
+                          CheckedRedirectHandler)
+    try:
+        with opener.open(Request(url, headers={'User-Agent': 'fyyur-image-proxy'}),
+                         timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    except (OSError, ValueError) as e:
+        raise ImageError('fetching {0!r} failed: {1}'.format(url, e))
+    if len(data) > max_bytes:
+        raise ImageError('{0!r} is larger than {1} bytes'.format(url, max_bytes))
+    return data
+
+
+def make_thumbnail(data, width):
+    # Fits the image in `width` (and twice that in height) without upscaling.
+    # Opaque images become progressive JPEGs; transparent ones stay PNG.
+    from PIL import Image, ImageOps
+    try:
+        image = Image.open(io.BytesIO(data))
+        # Lets the JPEG decoder scale down while decoding.
+        image.draft('RGB', (width, width * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 2))
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image.save(output, 'PNG', optimize=True)
+        else:
+            image.convert('RGB').save(output, 'JPEG', quality=82, optimize=True,
+                                      progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError('cannot resize image: {0}'.format(e))
+    return output.getvalue()
+
+
+def image_type(data):
+    return 'image/png' if data.startswith(b'\x89PNG') else 'image/jpeg'
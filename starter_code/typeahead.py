@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+class PrefixIndex(object):
+    # In-process, sorted prefix index of (name, id) pairs for one kind of
+    # entity. Lookups are a binary search followed by a short forward scan,
+    # and the index never holds more than `max_entries` names. Writers swap
+    # in a new list so readers never need the lock.
+
+    def __init__(self, kind, max_entries=100000):
+        self.kind = kind
+        self.max_entries = max_entries
+        self.entries = []
+        self.loaded = False
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, rows):
+        entries = sorted((name.lower(), name, id)
+                         for id, name in rows if name)
+        with self.lock:
+            self.entries = entries[:self.max_entries]
+            self.loaded = True
+
+    def add(self, id, name):
+        if not name:
+            return
+        entry = (name.lower(), name, id)
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                return
+            # The same change can arrive both locally and over NOTIFY.
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                return
+            entries = list(self.entries)
+            entries.insert(position, entry)
+            self.entries = entries
+
+    def search(self, prefix, k=10):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        entries = self.entries
+        results = []
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(results) < k:
+            key, name, id = entries[position]
+            if not key.startswith(prefix):
+                break
+            results.append({'id': id, 'name': name, 'kind': self.kind})
+            position += 1
+        return results